@@ -1,18 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal, Optional
+from datetime import datetime
 from app.core.database import get_db
 from app.crud import action_crud
-from app.models.schemas import ProcessedAction
+from app.models.schemas import ActionResponse, ActionType, ImportResult
+from app.services import action_transfer
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ProcessedAction])
-def read_actions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    actions = action_crud.get_actions(db, skip=skip, limit=limit)
-    # Convert SQL models to Pydantic models manually or let FastAPI handle it if config allows
+@router.get("/", response_model=List[ActionResponse])
+def read_actions(
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    type: Optional[ActionType] = None,
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    datetime_from: Optional[datetime] = None,
+    datetime_to: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Newest first. Pass the X-Next-Cursor header of the previous page as `cursor`
+    to continue; `skip` still works but gets slower the deeper you go.
+    """
+    filters = dict(type=type.value if type else None, category=category, priority=priority,
+                   datetime_from=datetime_from, datetime_to=datetime_to)
+    if skip and not cursor:
+        return action_crud.get_actions(db, skip=skip, limit=limit, **filters)
+
+    try:
+        actions, next_cursor = action_crud.get_actions_page(db, limit=limit, cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return actions
 
+@router.get("/export")
+def export_actions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    type: Optional[ActionType] = None,
+    category: Optional[str] = None,
+    priority: Optional[str] = None,
+    datetime_from: Optional[datetime] = None,
+    datetime_to: Optional[datetime] = None,
+):
+    """
+    Every matching action, streamed oldest first: one JSON object per line, or
+    CSV with a header row. Same filters as the list endpoint, no paging.
+    """
+    filters = dict(type=type.value if type else None, category=category, priority=priority,
+                   datetime_from=datetime_from, datetime_to=datetime_to)
+    filename = f"actions-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        action_transfer.export_chunks(format, **filters),
+        media_type=action_transfer.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import", response_model=ImportResult)
+async def import_actions(request: Request, format: Optional[Literal["ndjson", "csv"]] = None):
+    """
+    Bulk load from the body, read as it arrives: NDJSON or CSV (the export
+    format; picked from Content-Type unless `format` is given). Rows that fail
+    validation are skipped and reported by line number.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    parse = action_transfer.parse_csv if format == "csv" else action_transfer.parse_ndjson
+    return await action_transfer.import_records(parse(request.stream()))
+
 @router.delete("/{action_id}")
 def delete_action(action_id: int, db: Session = Depends(get_db)):
     success = action_crud.delete_action(db, action_id)
@@ -1,59 +1,83 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Depends
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.crud import action_crud
-import shutil
+from fastapi import APIRouter, HTTPException, Body, Request
+from fastapi.responses import JSONResponse
 import os
-import tempfile
 from app.services.ai_service import ai_service
+from app.services.pipeline import process_and_store, stream_and_store
+from app.services.job_queue import job_queue, JobQueueFull
+from app.services.result_cache import hash_bytes
+from app.services.uploads import MULTIPART_FILE_BODY, SpooledUpload, receive_upload
 from app.models.schemas import BrainDumpResponse
 
 router = APIRouter()
 
 @router.post("/process-text", response_model=BrainDumpResponse)
-async def process_text_endpoint(text: str = Body(..., embed=True), db: Session = Depends(get_db)):
+async def process_text_endpoint(text: str = Body(..., embed=True), stream: bool = False):
     """
     Debug endpoint to process text directly without audio.
     Useful for testing the LLM logic without a microphone.
+    With ?stream=true actions come back as NDJSON while the model is still writing.
     """
+    if stream:
+        return stream_and_store(lambda result: ai_service.stream_text(text, result))
+
     try:
         # We need to bypass the audio processing in AIService or add a text method
         # Let's modify AIService to handle text directly
-        result = await ai_service.process_text(text)
-        
-        # Save to DB
-        for action in result.actions:
-            action_crud.create_action(db, action)
-            
-        return result
+        # Process and save to DB (identical in-flight dumps share one call)
+        return await process_and_store(
+            "text", hash_bytes(text.encode("utf-8")), lambda: ai_service.process_text(text)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/process", response_model=BrainDumpResponse)
-async def process_audio_endpoint(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # Save uploaded file temporarily
-    # Create a temp file path
-    temp_dir = tempfile.mkdtemp()
-    temp_file_path = os.path.join(temp_dir, file.filename or "audio.m4a")
-    
+@router.post("/process", response_model=BrainDumpResponse, openapi_extra=MULTIPART_FILE_BODY)
+async def process_audio_endpoint(request: Request, async_mode: bool = False, stream: bool = False):
+    # Stream the upload (hashed + size-checked on the fly, spooled to disk only when large)
+    upload = await receive_upload(request)
+    upload.filename = upload.filename or "audio.m4a"
+    if stream and not async_mode:
+        # The upload has to live until the NDJSON stream is done
+        return stream_and_store(
+            lambda result: ai_service.stream_audio(upload.source, result, mime_type=upload.mime_type,
+                                                   content_hash=upload.content_hash),
+            cleanup=upload.close
+        )
     try:
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Process with AI
-        result = await ai_service.process_audio(temp_file_path)
-        
-        # Save to DB
-        for action in result.actions:
-            action_crud.create_action(db, action)
-            
-        return result
-        
+        if async_mode:
+            return await submit_job("audio", upload)
+
+        # Process with AI and save to DB. The shared call owns the upload from here
+        # and closes it when done, even if this request goes away first
+        return await process_and_store(
+            "audio", upload.content_hash,
+            lambda: ai_service.process_audio(upload.source, content_hash=upload.content_hash,
+                                             mime_type=upload.mime_type),
+            cleanup=upload.close
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Cleanup
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+        if async_mode:
+            # Cleanup (submit_job moved the file already when it succeeded)
+            upload.close()
+
+async def submit_job(kind: str, upload: SpooledUpload) -> JSONResponse:
+    """
+    Moves the upload where the job worker (or a restarted process) can find it
+    and returns 202 with the job id. Poll /jobs/{id} or stream /jobs/{id}/events.
+    """
+    job_id = job_queue.new_job_id()
+    input_path = job_queue.input_path(job_id, upload.filename)
+    try:
+        upload.save_to(input_path)
+        job = await job_queue.submit(job_id, kind, input_path, upload.content_hash, upload.mime_type)
+    except JobQueueFull as e:
+        os.remove(input_path)
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(status_code=202, content=job.model_dump(mode="json"))
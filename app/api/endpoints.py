@@ -1,28 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from app.api import audio_processor, actions
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.api import audio_processor, actions, jobs
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..services.ai_service import AIService
 from ..models import schemas, sql_models
-from ..core.database import get_db
+from ..core.database import get_async_db
+from ..core.config import settings
+from ..crud import action_crud
+from ..services.briefing_service import briefing_service, parse_briefing_time
+from ..services.uploads import MULTIPART_FILE_BODY, receive_upload
 from datetime import datetime
-import shutil
-import shutil
-import os
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import json
 import time
 
 router = APIRouter()
 
 router.include_router(audio_processor.router, prefix="/audio", tags=["audio"])
 router.include_router(actions.router, prefix="/actions", tags=["actions"])
+router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
 
 @router.post("/ask", response_model=schemas.AnswerResponse)
 async def ask_question(
     request: schemas.QuestionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # 1. Fetch recent actions (Context)
-    # Limit to last 50 items to keep context size manageable
-    actions = db.query(sql_models.Action).order_by(sql_models.Action.created_at.desc()).limit(50).all()
+    # 1. Fetch context: full-text matches for the question plus a few recent actions
+    actions = await db.run_sync(
+        action_crud.get_question_context, request.question,
+        top_k=settings.ASK_SEARCH_TOP_K, recent=settings.ASK_RECENT_WINDOW
+    )
     
     # 2. Get Answer
     # ai_service is instantiated globally in endpoints, but let's use a fresh one or the global one.
@@ -37,25 +45,89 @@ async def ask_question(
     
     return {"answer": answer_text}
 
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: schemas.QuestionRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Streaming /ask: Server-Sent Events with one `token` event per chunk,
+    then a `done` event with timing and token usage (or an `error` event).
+    """
+    from ..services.ai_service import ai_service
+    from ..services.model_backend import ModelResponse
+
+    actions = await db.run_sync(
+        action_crud.get_question_context, request.question,
+        top_k=settings.ASK_SEARCH_TOP_K, recent=settings.ASK_RECENT_WINDOW
+    )
+
+    async def event_stream():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = 0
+        result = ModelResponse(text="", model="flash")
+        stream = ai_service.stream_answer(actions, request.question, result=result)
+        try:
+            async for chunk in stream:
+                if await http_request.is_disconnected():
+                    # Stop pulling from the model as soon as the client is gone
+                    return
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunks += 1
+                yield f"event: token\ndata: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Q&A stream error: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Üzgünüm, şu an cevap veremiyorum.'}, ensure_ascii=False)}\n\n"
+            return
+        finally:
+            await stream.aclose()
+
+        stats = {
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "first_token_ms": first_token_ms,
+            "chunks": chunks,
+            "context_actions": len(actions),
+            "model": result.model,
+            "prompt_tokens": result.prompt_tokens,
+            "output_tokens": result.output_tokens,
+        }
+        yield f"event: done\ndata: {json.dumps(stats)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    from ..services.result_cache import result_cache
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
 # --- USER PROFILE ENDPOINTS ---
-@router.get("/user", response_model=schemas.UserResponse)
-async def get_user_profile(db: Session = Depends(get_db)):
+async def _get_or_create_user(db: AsyncSession) -> sql_models.User:
     # Simulating single user for MVP
-    user = db.query(sql_models.User).first()
+    user = (await db.scalars(select(sql_models.User).limit(1))).first()
     if not user:
         # Auto-create default user
         user = sql_models.User(full_name="BrainDump User", email="user@braindump.app")
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     return user
 
+@router.get("/user", response_model=schemas.UserResponse)
+async def get_user_profile(db: AsyncSession = Depends(get_async_db)):
+    return await _get_or_create_user(db)
+
 @router.patch("/user", response_model=schemas.UserResponse)
 async def update_user_profile(
     user_update: schemas.UserUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(sql_models.User).first()
+    user = (await db.scalars(select(sql_models.User).limit(1))).first()
     if not user:
         user = sql_models.User()
         db.add(user)
@@ -66,7 +138,17 @@ async def update_user_profile(
     if user_update.email is not None:
         user.email = user_update.email
     if user_update.morning_briefing_time is not None:
+        try:
+            parse_briefing_time(user_update.morning_briefing_time, strict=True)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="morning_briefing_time must be HH:MM")
         user.morning_briefing_time = user_update.morning_briefing_time
+    if user_update.timezone is not None:
+        try:
+            ZoneInfo(user_update.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Unknown timezone: {user_update.timezone}")
+        user.timezone = user_update.timezone
     
     # Handle Booleans manually for SQLite compliance if needed, but SQLAlchemy usually handles bool->int mapping.
     # Let's trust SQLAlchemy TypeDecorator or standard bool behavior, but for SQLite safer to cast if we declared Integer.
@@ -77,55 +159,63 @@ async def update_user_profile(
     if user_update.is_notion_connected is not None:
         user.is_notion_connected = 1 if user_update.is_notion_connected else 0
 
-    db.commit()
-    db.refresh(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
+# --- MORNING BRIEFING ---
+@router.get("/briefing", response_model=schemas.BriefingResponse)
+async def get_briefing(db: AsyncSession = Depends(get_async_db)):
+    """
+    The current morning briefing, precomputed in the background. `summary` is
+    null for the first moments after it's created; `stale` means actions were
+    added since it was written (the new ones are already in `items`).
+    """
+    user = await _get_or_create_user(db)
+    return await briefing_service.get(user)
+
 # --- VISION ENDPOINTS ---
-@router.post("/process-image", response_model=schemas.BrainDumpResponse)
+@router.post("/process-image", response_model=schemas.BrainDumpResponse, openapi_extra=MULTIPART_FILE_BODY)
 async def process_image_endpoint(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    async_mode: bool = False,
+    stream: bool = False
 ):
-    # 1. Save temp file
-    temp_filename = f"temp_{int(time.time())}_{file.filename}"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+    # 1. Receive the upload (streamed, never written into the working directory)
+    upload = await receive_upload(request)
+    if stream and not async_mode:
+        from ..services.ai_service import ai_service
+        from ..services.pipeline import stream_and_store
+
+        # Actions come back as NDJSON while the model is still writing
+        return stream_and_store(
+            lambda result: ai_service.stream_image(upload.source, result, mime_type=upload.mime_type,
+                                                   content_hash=upload.content_hash),
+            cleanup=upload.close
+        )
     try:
+        if async_mode:
+            return await audio_processor.submit_job("image", upload)
+
         from ..services.ai_service import ai_service
+        from ..services.pipeline import process_and_store
+
+        # 2. Process with Gemini Vision and 3. Save Actions to DB
+        # Concurrent uploads of the same image share one call and one write;
+        # that call owns the upload and closes it when done
+        return await process_and_store(
+            "image", upload.content_hash,
+            lambda: ai_service.process_image(upload.source, content_hash=upload.content_hash,
+                                             mime_type=upload.mime_type),
+            cleanup=upload.close
+        )
         
-        # 2. Process with Gemini Vision
-        brain_dump = await ai_service.process_image(temp_filename)
-        
-        # 3. Save Actions to DB
-        created_actions_db = []
-        for action in brain_dump.actions:
-            db_action = sql_models.Action(
-                type=action.type,
-                content=action.content,
-                category=action.category,
-                datetime_iso=action.datetime_iso,
-                priority=action.priority,
-                confidence=action.confidence
-            )
-            db.add(db_action)
-            created_actions_db.append(db_action)
-        
-        db.commit()
-        
-        # 4. Refresh IDs
-        for a in created_actions_db:
-            db.refresh(a)
-            
-        return brain_dump
-        
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Image processing error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Cleanup
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        if async_mode:
+            # Cleanup (submit_job moved the file already when it succeeded)
+            upload.close()
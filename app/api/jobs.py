@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+from app.models.schemas import JobResponse, JobStatus
+from app.services.job_queue import job_queue
+
+router = APIRouter()
+
+TERMINAL_STATUSES = (JobStatus.DONE, JobStatus.FAILED)
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of job status changes.
+    Sends the current state immediately and closes after done/failed.
+    """
+    listener = job_queue.subscribe(job_id)
+    job = await job_queue.get(job_id)
+    if not job:
+        job_queue.unsubscribe(job_id, listener)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        try:
+            current = job
+            yield f"event: {current.status.value}\ndata: {current.model_dump_json()}\n\n"
+            while current.status not in TERMINAL_STATUSES:
+                if await request.is_disconnected():
+                    break
+                try:
+                    current = await asyncio.wait_for(listener.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {current.status.value}\ndata: {current.model_dump_json()}\n\n"
+        finally:
+            job_queue.unsubscribe(job_id, listener)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
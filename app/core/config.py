@@ -1,4 +1,5 @@
 import os
+from typing import Dict
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -9,6 +10,134 @@ class Settings(BaseSettings):
     PROJECT_VERSION: str = "0.1.0"
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
 
+    # Model backend: "gemini" for production, "stub" for offline load tests
+    MODEL_BACKEND: str = os.getenv("MODEL_BACKEND", "gemini")
+    GEMINI_FLASH_MODEL: str = "gemini-flash-latest"
+    GEMINI_PRO_MODEL: str = "gemini-pro-latest"
+    STUB_LATENCY_MS: int = 0
+    STUB_LATENCY_JITTER_MS: int = 0
+    STUB_ERROR_RATE: float = 0.0  # share of calls failing with 503
+    STUB_RATE_LIMIT_RATE: float = 0.0  # share of calls failing with 429
+    STUB_SEED: int = 0
+    # Build the model client right after startup instead of on the first request
+    WARM_UP_ON_STARTUP: bool = True
+
+    # Database: the async engine reuses the same URL with an async driver (sqlite -> aiosqlite,
+    # postgresql -> asyncpg). Full-text search for /ask needs SQLite FTS5, elsewhere it uses recency only
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./braindump.db")
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+
+    # Model call policy: client-side quota, backoff, circuit breaker, retry budgets
+    MODEL_FLASH_RPM: int = 60  # 0 disables the client-side limit
+    MODEL_PRO_RPM: int = 30
+    RETRY_BACKOFF_BASE_SECONDS: float = 0.5
+    RETRY_BACKOFF_MAX_SECONDS: float = 8.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    # Attempts on the primary model per call before falling back, by endpoint
+    MODEL_RETRY_BUDGETS: Dict[str, int] = {"text": 3, "audio": 3, "image": 3, "ask": 1, "default": 3}
+    # Per-call deadline per model, a timeout counts as a transient failure
+    MODEL_TIMEOUT_SECONDS: Dict[str, float] = {"flash": 30.0, "pro": 60.0}
+    # Hedging: fire the fallback too once flash runs past its rolling p95
+    HEDGE_ENABLED: bool = False
+    HEDGE_QUANTILE: float = 0.95
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+
+    # Observability: Prometheus text format on GET /metrics
+    METRICS_ENABLED: bool = True
+    # Log a JSON line with per-stage timings for requests slower than this (0 disables)
+    SLOW_REQUEST_LOG_MS: float = 0.0
+
+    # Result cache (content hash + prompt version + time bucket)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_TTL_SECONDS: int = 900
+    RESULT_CACHE_BUCKET_SECONDS: int = 300
+    RESULT_CACHE_SQLITE_PATH: str = ""  # e.g. "./cache/results.db" to persist across restarts
+
+    # Micro-batching of concurrent /audio/process-text calls into one model call
+    MICRO_BATCH_ENABLED: bool = False
+    MICRO_BATCH_MAX_SIZE: int = 8
+    MICRO_BATCH_MAX_WAIT_MS: float = 20.0
+
+    # Uploads: hashed and size-checked while streaming, spooled to disk above the memory limit
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_MEMORY_LIMIT: int = 1024 * 1024
+    UPLOAD_TEMP_DIR: str = ""  # default: a private directory under the system temp dir
+
+    # Audio pre-processing before upload (needs numpy + av, skipped when missing)
+    AUDIO_PREPROCESS_ENABLED: bool = True
+    AUDIO_TARGET_SAMPLE_RATE: int = 16000
+    AUDIO_BITRATE: int = 24000  # Opus, plenty for speech
+    AUDIO_VAD_MARGIN_DB: float = 12.0  # voiced = this far above the recording's noise floor
+    AUDIO_VAD_FLOOR_DB: float = -55.0
+    AUDIO_VAD_PAD_MS: int = 150
+    AUDIO_SILENCE_MAX_MS: int = 700  # longer pauses get shortened...
+    AUDIO_SILENCE_KEEP_MS: int = 300  # ...to this
+
+    # Image pre-processing before upload (needs Pillow, skipped when missing)
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1600
+    IMAGE_JPEG_QUALITY: int = 82
+    # Near-identical photos (perceptual hash within this many bits) reuse the earlier result; -1 disables
+    IMAGE_DEDUPE_MAX_DISTANCE: int = 6
+    IMAGE_DEDUPE_MAX_PIXEL_DIFF: float = 5.0  # mean abs difference of 32x32 grayscale thumbnails
+    IMAGE_DEDUPE_TTL_SECONDS: int = 300
+    IMAGE_DEDUPE_MAX_ENTRIES: int = 512
+
+    # Remote (provider-side) files: reused by content hash, deleted once idle
+    UPLOAD_CONCURRENCY: int = 8
+    REMOTE_FILE_IDLE_SECONDS: float = 3600.0
+    REMOTE_FILE_EXPIRY_MARGIN_SECONDS: float = 3600.0  # don't reuse a file this close to its expiry
+    REMOTE_FILE_MAX_FILES: int = 1000
+    REMOTE_FILE_SWEEP_SECONDS: float = 300.0
+
+    # Near-duplicate actions (same type, similar content, same time) are merged instead of inserted
+    ACTION_DEDUPE_ENABLED: bool = True
+    ACTION_DEDUPE_WINDOW_HOURS: float = 24.0  # only compare against actions created this recently
+    ACTION_DEDUPE_MIN_SIMILARITY: float = 0.8  # Jaccard similarity of character trigrams
+    ACTION_DEDUPE_TIME_TOLERANCE_MINUTES: float = 15.0
+    ACTION_DEDUPE_MAX_ENTRIES: int = 20000
+
+    # Bulk export/import (GET /actions/export, POST /actions/import)
+    ACTION_EXPORT_BATCH: int = 1000  # rows per DB fetch and per written chunk
+    ACTION_IMPORT_BATCH: int = 5000  # rows per transaction
+    ACTION_IMPORT_MAX_ERRORS: int = 20
+
+    # /ask context: full-text top-k plus a small recency window
+    ASK_SEARCH_TOP_K: int = 20
+    ASK_RECENT_WINDOW: int = 10
+
+    # Async job pipeline (?async_mode=true on /audio/process and /process-image)
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_SIZE: int = 100
+    JOB_STORAGE_DIR: str = "./job_files"
+
+    # Reminder scheduler: fires ALARM/REMINDER actions at their datetime_iso
+    REMINDERS_ENABLED: bool = True
+    REMINDER_NOTIFIER: str = "log"  # "log" | "webhook"
+    REMINDER_WEBHOOK_URL: str = ""
+    REMINDER_WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    REMINDER_WINDOW_SECONDS: int = 600  # how far ahead reminders are kept in memory
+    REMINDER_LOAD_BATCH: int = 1000  # max reminders loaded per query
+    # Reminders found this late (e.g. after downtime) are marked fired without a notification
+    REMINDER_MISFIRE_GRACE_SECONDS: int = 3600
+
+    # Morning briefings: precomputed shortly before each user's morning_briefing_time
+    BRIEFINGS_ENABLED: bool = True
+    DEFAULT_TIMEZONE: str = "Europe/Istanbul"  # for users without one
+    BRIEFING_LEAD_MINUTES: int = 30
+    BRIEFING_CHECK_SECONDS: float = 60.0
+    # After new actions land in a briefing, wait this long for more before rewriting the summary
+    BRIEFING_REFRESH_DELAY_SECONDS: float = 120.0
+    BRIEFING_RETRY_SECONDS: float = 300.0  # after a failed summary, first one included
+    BRIEFING_TODO_LOOKBACK_DAYS: int = 7  # undated TODOs created this recently are included
+    BRIEFING_MAX_ITEMS: int = 50
+
     class Config:
         case_sensitive = True
 
@@ -1,28 +1,296 @@
+import base64
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import insert, select, tuple_, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 from app.models.sql_models import Action
-from app.models.schemas import ProcessedAction
+from app.models.schemas import ActionImport, ActionType, ProcessedAction, BrainDumpResponse
+from app.core.config import settings
+from app.core.database import IS_SQLITE
+from app.services import action_dedupe
+
+REMINDER_TYPES = (ActionType.ALARM, ActionType.REMINDER)
+
+def reminder_time(action: ProcessedAction, now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    When an ALARM/REMINDER should fire: its datetime_iso, or "now + delay_seconds"
+    for relative ones ("alarm in 2 minutes") that come without a date.
+    """
+    if action.datetime_iso is not None or action.type not in REMINDER_TYPES or not action.delay_seconds:
+        return action.datetime_iso
+    return (now or datetime.utcnow()) + timedelta(seconds=action.delay_seconds)
+
+def _action_values(action: ProcessedAction) -> dict:
+    return {
+        "type": action.type.value,
+        "content": action.content,
+        "category": action.category,
+        "datetime_iso": reminder_time(action),
+        "delay_seconds": action.delay_seconds,
+        "priority": action.priority,
+        "confidence": action.confidence,
+    }
+
+def _dedupe_index(db: Session) -> Optional[action_dedupe.NearDuplicateIndex]:
+    """The near-duplicate index, filled with the recent actions on first use (None when disabled)."""
+    if not settings.ACTION_DEDUPE_ENABLED:
+        return None
+    index = action_dedupe.index
+    if not index.loaded:
+        since = datetime.utcnow() - index.window
+        # Newest max_entries of the window, handed over oldest first
+        index.load_once(lambda: reversed(
+            db.query(Action.id, Action.type, Action.content, Action.datetime_iso, Action.created_at)
+            .filter(Action.created_at >= since)
+            .order_by(Action.created_at.desc(), Action.id.desc()).limit(index.max_entries).all()))
+    return index
+
+def load_dedupe_index(db: Session):
+    """Startup warm-up: fills the index now rather than on the first insert."""
+    _dedupe_index(db)
+
+def _fingerprint(values: dict):
+    return action_dedupe.fingerprint(values["type"], values["content"], values["datetime_iso"])
 
 def create_action(db: Session, action: ProcessedAction):
-    db_action = Action(
-        type=action.type.value,
-        content=action.content,
-        category=action.category,
-        datetime_iso=action.datetime_iso,
-        priority=action.priority,
-        confidence=action.confidence
-    )
+    """Inserts one action, or returns the existing near-duplicate instead."""
+    values = _action_values(action)
+    index = _dedupe_index(db)
+    if index is None:
+        return _insert_action(db, values)
+    fp = _fingerprint(values)
+    with index.lock:
+        existing = index.find(fp) if fp is not None else None
+        if existing is not None:
+            db_action = db.get(Action, existing)
+            if db_action is not None:
+                action_dedupe.merged_total.inc()
+                return db_action
+        db_action = _insert_action(db, values)
+        if fp is not None:
+            index.add(db_action.id, fp, db_action.created_at)
+    return db_action
+
+def _insert_action(db: Session, values: dict) -> Action:
+    db_action = Action(**values)
     db.add(db_action)
     db.commit()
     db.refresh(db_action)
     return db_action
 
-def get_actions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Action).order_by(Action.created_at.desc()).offset(skip).limit(limit).all()
+def create_actions(db: Session, brain_dump: BrainDumpResponse) -> List[int]:
+    """
+    Inserts every action of a dump in a single transaction and returns the IDs
+    in the same order as brain_dump.actions. Near-duplicates (of recent actions
+    or of each other) are not inserted; their slot holds the existing ID.
+    """
+    if not brain_dump.actions:
+        return []
+    rows = [_action_values(action) for action in brain_dump.actions]
+    index = _dedupe_index(db)
+    if index is None:
+        return _insert_rows(db, rows)
+
+    with index.lock:
+        slots = []  # per action: ("existing", id) | ("new", position in `fresh`)
+        fresh, fresh_fps = [], []
+        for values in rows:
+            fp = _fingerprint(values)
+            existing = index.find(fp) if fp is not None else None
+            if existing is None and fp is not None:
+                # "süt al, süt al" inside the same dump
+                existing_pos = next((i for i, known in enumerate(fresh_fps)
+                                     if known is not None and index.is_duplicate(known, fp)), None)
+                if existing_pos is not None:
+                    slots.append(("new", existing_pos))
+                    action_dedupe.merged_total.inc()
+                    continue
+            if existing is not None:
+                slots.append(("existing", existing))
+                action_dedupe.merged_total.inc()
+                continue
+            slots.append(("new", len(fresh)))
+            fresh.append(values)
+            fresh_fps.append(fp)
+
+        new_ids = _insert_rows(db, fresh) if fresh else []
+        now = datetime.utcnow()
+        for action_id, fp in zip(new_ids, fresh_fps):
+            if fp is not None:
+                index.add(action_id, fp, now)
+    return [value if kind == "existing" else new_ids[value] for kind, value in slots]
+
+def _insert_rows(db: Session, rows: List[dict]) -> List[int]:
+    try:
+        # executemany-style insert, RETURNING keeps the ids in parameter order
+        result = db.execute(
+            insert(Action).returning(Action.id, sort_by_parameter_order=True),
+            rows,
+        )
+        ids = list(result.scalars())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return ids
+
+def encode_cursor(action: Action) -> str:
+    raw = f"{action.created_at.isoformat()}|{action.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for anything that isn't a cursor we produced."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, action_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(action_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # datetime_iso is stored as naive UTC: "14:30+03:00" has to compare as 11:30
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _filter_clauses(type: Optional[str] = None, category: Optional[str] = None, priority: Optional[str] = None,
+                    datetime_from: Optional[datetime] = None, datetime_to: Optional[datetime] = None) -> list:
+    datetime_from, datetime_to = _naive_utc(datetime_from), _naive_utc(datetime_to)
+    clauses = []
+    if type:
+        clauses.append(Action.type == type)
+    if category:
+        clauses.append(Action.category == category)
+    if priority:
+        clauses.append(Action.priority == priority)
+    if datetime_from:
+        clauses.append(Action.datetime_iso >= datetime_from)
+    if datetime_to:
+        clauses.append(Action.datetime_iso < datetime_to)
+    return clauses
+
+def _filtered_query(db: Session, **filters):
+    return db.query(Action).filter(*_filter_clauses(**filters))
+
+def get_actions(db: Session, skip: int = 0, limit: int = 100, **filters):
+    # Offset paging, kept for old clients. Cost grows with `skip`, prefer get_actions_page
+    return (_filtered_query(db, **filters)
+            .order_by(Action.created_at.desc(), Action.id.desc())
+            .offset(skip).limit(limit).all())
+
+def get_actions_page(db: Session, limit: int = 100, cursor: Optional[str] = None,
+                     **filters) -> Tuple[List[Action], Optional[str]]:
+    """
+    Keyset paging, newest first. Returns the page and the cursor for the next
+    one (None on the last page). Cost is independent of how deep the page is.
+    """
+    query = _filtered_query(db, **filters)
+    if cursor:
+        created_at, action_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Action.created_at, Action.id) < (created_at, action_id))
+    rows = query.order_by(Action.created_at.desc(), Action.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+EXPORT_COLUMNS = (Action.id, Action.type, Action.content, Action.category, Action.datetime_iso,
+                  Action.delay_seconds, Action.priority, Action.confidence, Action.created_at, Action.fired_at)
+
+def iter_action_batches(db: Session, batch_size: int = 1000, **filters):
+    """
+    Every matching action as plain rows (EXPORT_COLUMNS), oldest id first, in
+    lists of `batch_size`. Server-side cursor: memory stays at one batch.
+    """
+    result = db.execute(
+        select(*EXPORT_COLUMNS).where(*_filter_clauses(**filters)).order_by(Action.id)
+        .execution_options(yield_per=batch_size)
+    )
+    yield from result.partitions()
+
+def import_actions(db: Session, records: List[ActionImport]) -> List[int]:
+    """
+    Bulk insert in one transaction, as given: no near-duplicate merging and no
+    delay_seconds -> datetime_iso fill-in, created_at/fired_at are kept.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for record in records:
+        values = _action_values(record)
+        values.update(datetime_iso=record.datetime_iso, created_at=record.created_at or now,
+                      fired_at=record.fired_at)
+        rows.append(values)
+    return _insert_rows(db, rows) if rows else []
 
 def delete_action(db: Session, action_id: int):
     db_action = db.query(Action).filter(Action.id == action_id).first()
     if db_action:
         db.delete(db_action)
         db.commit()
+        action_dedupe.index.remove(action_id)
         return True
     return False
+
+BRIEFING_TYPES = (ActionType.CALENDAR_EVENT, ActionType.TODO, ActionType.REMINDER)
+
+def belongs_to_briefing(action: Action, window_start: datetime, window_end: datetime,
+                        todo_since: datetime) -> bool:
+    """Same rule as get_briefing_actions, for a single freshly stored action."""
+    if action.type not in [t.value for t in BRIEFING_TYPES]:
+        return False
+    if action.datetime_iso is not None:
+        return window_start <= action.datetime_iso < window_end
+    return action.type == ActionType.TODO.value and action.created_at >= todo_since
+
+def get_briefing_actions(db: Session, window_start: datetime, window_end: datetime, todo_since: datetime,
+                         limit: int = 50) -> List[Action]:
+    """
+    The day's CALENDAR_EVENT/TODO/REMINDER actions in time order, then undated
+    TODOs created since `todo_since`, newest first.
+    """
+    dated = (db.query(Action)
+             .filter(Action.datetime_iso >= window_start, Action.datetime_iso < window_end,
+                     Action.type.in_([t.value for t in BRIEFING_TYPES]))
+             .order_by(Action.datetime_iso, Action.id).limit(limit).all())
+    if len(dated) >= limit:
+        return dated
+    todos = (db.query(Action)
+             .filter(Action.type == ActionType.TODO.value, Action.created_at >= todo_since,
+                     Action.datetime_iso.is_(None))
+             .order_by(Action.created_at.desc(), Action.id.desc()).limit(limit - len(dated)).all())
+    return dated + todos
+
+def _match_query(question: str) -> Optional[str]:
+    # Turkish is agglutinative ("sütü", "sütünü"), so match on a short prefix of each word
+    words = {w.lower() for w in re.findall(r"\w+", question) if len(w) >= 3}
+    terms = [f'"{w[:max(3, min(5, len(w) - 1))]}"*' for w in sorted(words)]
+    return " OR ".join(terms) if terms else None
+
+def search_actions(db: Session, question: str, limit: int = 20) -> List[Action]:
+    """
+    Best matching actions for a free-text question, ranked by FTS5 bm25.
+    Returns [] when nothing matches or full-text search is unavailable.
+    """
+    match = _match_query(question)
+    if not match or not IS_SQLITE:
+        return []
+    try:
+        ids = [row[0] for row in db.execute(
+            text("SELECT rowid FROM actions_fts WHERE actions_fts MATCH :match ORDER BY rank LIMIT :limit"),
+            {"match": match, "limit": limit},
+        )]
+    except OperationalError as e:
+        print(f"Action search failed: {e}")
+        return []
+    if not ids:
+        return []
+    by_id = {a.id: a for a in db.query(Action).filter(Action.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+def get_question_context(db: Session, question: str, top_k: int = 20, recent: int = 10) -> List[Action]:
+    """Relevant actions first, then the most recent ones not already included."""
+    context = search_actions(db, question, limit=top_k)
+    seen = {a.id for a in context}
+    recent_actions = db.query(Action).order_by(Action.created_at.desc(), Action.id.desc()).limit(recent).all()
+    context.extend(a for a in recent_actions if a.id not in seen)
+    return context
@@ -1,18 +1,79 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.endpoints import router as api_router
 from app.core.config import settings
 
-from app.core import database
+from app.core import database, metrics
 from app.models import sql_models
+from app.services.briefing_service import briefing_service
+from app.services.job_queue import job_queue
+from app.services.reminder_scheduler import reminder_scheduler
 
-# Create Tables
-sql_models.Base.metadata.create_all(bind=database.engine)
+def init_db():
+    # Create Tables (at startup, not import, so tools importing the app don't touch the DB)
+    sql_models.Base.metadata.create_all(bind=database.engine)
+    database.upgrade_schema(database.engine, sql_models.Base.metadata)
+    sql_models.create_action_search_index(database.engine)
+
+def _with_session(func):
+    db = database.SessionLocal()
+    try:
+        return func(db)
+    finally:
+        db.close()
+
+async def warm_up():
+    """
+    Pays the first-request costs while the app is already serving:
+    provider SDK import/config, the first pooled DB connection and the
+    near-duplicate index.
+    """
+    from app.crud import action_crud
+    from app.services.ai_service import ai_service
+
+    started = time.perf_counter()
+    try:
+        async with database.async_engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+        await ai_service.warm_up()
+        await asyncio.to_thread(_with_session, action_crud.load_dedupe_index)
+        print(f"Warm-up done in {(time.perf_counter() - started) * 1000:.0f}ms")
+    except Exception as e:
+        # Not fatal, the first request will just do the work itself
+        print(f"Warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.services.ai_service import ai_service
+
+    await asyncio.to_thread(init_db)
+    # Background workers for async_mode jobs (also resumes unfinished jobs)
+    await job_queue.start()
+    # Sweeper for idle files on the provider side
+    ai_service.uploads.start()
+    if settings.REMINDERS_ENABLED:
+        reminder_scheduler.start()
+    if settings.BRIEFINGS_ENABLED:
+        briefing_service.start()
+    warm_up_task = asyncio.create_task(warm_up()) if settings.WARM_UP_ON_STARTUP else None
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await job_queue.stop()
+    await reminder_scheduler.stop()
+    await briefing_service.stop()
+    await ai_service.uploads.stop()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
-    description="Backend API for BrainDump - The Zero-Effort Life Organizer"
+    description="Backend API for BrainDump - The Zero-Effort Life Organizer",
+    lifespan=lifespan
 )
 
 # Allow CORS for Web Client
@@ -26,6 +87,45 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api/v1")
 
+def _route_label(request: Request) -> str:
+    # Path template rather than the raw path, so ids don't blow up the label set
+    if request.scope.get("route") is None:
+        return "unmatched"
+    path = request.url.path
+    for name, value in request.path_params.items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+if settings.METRICS_ENABLED:
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        trace = metrics.start_trace()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            route = _route_label(request)
+            metrics.request_seconds.observe(elapsed, method=request.method, route=route, status=status)
+            if settings.SLOW_REQUEST_LOG_MS and elapsed * 1000 >= settings.SLOW_REQUEST_LOG_MS:
+                print(json.dumps({
+                    "event": "slow_request",
+                    "method": request.method,
+                    "route": route,
+                    "status": status,
+                    "ms": round(elapsed * 1000, 1),
+                    "stages": trace,
+                }, ensure_ascii=False))
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        # Pull-style collectors live next to the singletons they read
+        import app.services.ai_service  # noqa: F401
+        return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "BrainDump API is running", "status": "active"}
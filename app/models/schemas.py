@@ -1,7 +1,7 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timezone
 
 class ActionType(str, Enum):
     CALENDAR_EVENT = "CALENDAR_EVENT"
@@ -20,6 +20,50 @@ class ProcessedAction(BaseModel):
     priority: Optional[str] = None
     confidence: float
 
+    @field_validator("type", mode="before")
+    @classmethod
+    def normalize_type(cls, v):
+        return v.strip().upper() if isinstance(v, str) else v
+
+    @field_validator("datetime_iso")
+    @classmethod
+    def to_utc(cls, v):
+        # The model sometimes answers in local time (+03:00); everything is stored as UTC
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc)
+        return v
+
+class ActionResponse(ProcessedAction):
+    id: int
+    created_at: Optional[datetime] = None
+    fired_at: Optional[datetime] = None  # ALARM/REMINDER only, once the scheduler has fired it
+
+    class Config:
+        from_attributes = True
+
+class ActionImport(ProcessedAction):
+    # Exports carry id too; it's ignored, imported rows get new ids
+    confidence: float = 1.0  # hand-made files usually leave it out
+    created_at: Optional[datetime] = None
+    fired_at: Optional[datetime] = None
+
+    @field_validator("created_at", "fired_at")
+    @classmethod
+    def timestamps_to_utc(cls, v):
+        # Stored as naive UTC like everything else
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    imported: int
+    skipped: int  # rows that failed validation
+    errors: List[ImportRowError]  # the first ACTION_IMPORT_MAX_ERRORS of them
+
 class BrainDumpResponse(BaseModel):
     summary: str
     actions: List[ProcessedAction]
@@ -35,6 +79,7 @@ class UserBase(BaseModel):
     full_name: Optional[str] = None
     email: Optional[str] = None
     morning_briefing_time: Optional[str] = "09:00"
+    timezone: Optional[str] = None  # IANA name, e.g. "Europe/Istanbul"
 
 class UserUpdate(UserBase):
     is_google_calendar_connected: Optional[bool] = None
@@ -48,3 +93,28 @@ class UserResponse(UserBase):
     class Config:
         orm_mode = True
 
+
+# Async Job Schemas
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: JobStatus
+    result: Optional[BrainDumpResponse] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+# Morning Briefing Schemas
+class BriefingResponse(BaseModel):
+    day: str
+    summary: Optional[str] = None  # None until the first summary is written
+    items: List[ActionResponse]
+    stale: bool  # new actions were added since the summary was written
+    generated_at: Optional[datetime] = None
@@ -1,7 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, UniqueConstraint, text
+from sqlalchemy.exc import OperationalError
 from app.core.database import Base
 from datetime import datetime
 
+# Literal (no bound parameters) so SQLite can match queries against the partial index
+PENDING_REMINDER = text("fired_at IS NULL AND type IN ('ALARM', 'REMINDER')")
+
 class Action(Base):
     __tablename__ = "actions"
 
@@ -10,9 +14,67 @@ class Action(Base):
     content = Column(String)
     category = Column(String, nullable=True)
     datetime_iso = Column(DateTime, nullable=True)
+    delay_seconds = Column(Integer, nullable=True)
     priority = Column(String, nullable=True)
     confidence = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set once the reminder scheduler has claimed the ALARM/REMINDER (see reminder_scheduler)
+    fired_at = Column(DateTime, nullable=True)
+
+    # Keyset pagination walks (created_at, id) backwards; each filter gets its own
+    # prefix so WHERE + ORDER BY + LIMIT is answered by one index range scan
+    __table_args__ = (
+        Index("ix_actions_created_id", "created_at", "id"),
+        Index("ix_actions_type_created_id", "type", "created_at", "id"),
+        Index("ix_actions_category_created_id", "category", "created_at", "id"),
+        Index("ix_actions_priority_created_id", "priority", "created_at", "id"),
+        Index("ix_actions_datetime_iso_id", "datetime_iso", "id"),
+        # Only reminders that still have to fire, so loading the next window never
+        # touches fired ones or the rest of the table
+        Index("ix_actions_pending_reminders", "datetime_iso", "id",
+              sqlite_where=PENDING_REMINDER, postgresql_where=PENDING_REMINDER),
+    )
+
+# Full-text index over actions (SQLite FTS5, external content).
+# Triggers keep it in sync for every write path, including bulk Core inserts.
+ACTION_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS actions_fts USING fts5(
+        content, category, content='actions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS actions_fts_ai AFTER INSERT ON actions BEGIN
+        INSERT INTO actions_fts(rowid, content, category) VALUES (new.id, new.content, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS actions_fts_ad AFTER DELETE ON actions BEGIN
+        INSERT INTO actions_fts(actions_fts, rowid, content, category) VALUES ('delete', old.id, old.content, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS actions_fts_au AFTER UPDATE OF content, category ON actions BEGIN
+        INSERT INTO actions_fts(actions_fts, rowid, content, category) VALUES ('delete', old.id, old.content, old.category);
+        INSERT INTO actions_fts(rowid, content, category) VALUES (new.id, new.content, new.category);
+    END""",
+]
+
+def create_action_search_index(bind) -> bool:
+    """
+    Creates the FTS table and triggers if missing and backfills existing rows.
+    Returns False when the SQLite build has no FTS5 or the database isn't SQLite
+    (search falls back to recency).
+    """
+    if bind.dialect.name != "sqlite":
+        print("Full-text search disabled: needs SQLite FTS5")
+        return False
+    try:
+        with bind.begin() as conn:
+            existed = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'actions_fts'"
+            )).first() is not None
+            for statement in ACTION_SEARCH_DDL:
+                conn.execute(text(statement))
+            if not existed:
+                conn.execute(text("INSERT INTO actions_fts(actions_fts) VALUES ('rebuild')"))
+        return True
+    except OperationalError as e:
+        print(f"Full-text search disabled: {e}")
+        return False
 
 class User(Base):
     __tablename__ = "users"
@@ -23,6 +85,7 @@ class User(Base):
     
     # Preferences / Context
     morning_briefing_time = Column(String, default="09:00")
+    timezone = Column(String, nullable=True)  # IANA name, settings.DEFAULT_TIMEZONE when unset
     
     # Integration Status (The Hands)
     is_google_calendar_connected = Column(Integer, default=0) # SQLite uses 0/1 for boolean
@@ -30,3 +93,41 @@ class User(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex
+    kind = Column(String)  # "audio" | "image"
+    status = Column(String, index=True, default="queued")  # queued | running | done | failed
+    input_path = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)
+    mime_type = Column(String, nullable=True)  # raw-body uploads may have no extension to guess from
+    result = Column(Text, nullable=True)  # BrainDumpResponse JSON
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Briefing(Base):
+    __tablename__ = "briefings"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True)
+    day = Column(String)  # user's local date, YYYY-MM-DD
+    # The local day in UTC, to find the briefings a new action belongs to
+    window_start = Column(DateTime)
+    window_end = Column(DateTime)
+    items = Column(Text, default="[]")  # JSON list of ActionResponse
+    summary = Column(Text, nullable=True)  # model-written, None until generated
+    stale = Column(Integer, default=1)  # summary needs regenerating (SQLite 0/1)
+    generated_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # Set after a failed summary: no new model call before then
+    retry_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", name="uq_briefings_user_day"),
+        Index("ix_briefings_window", "window_start", "window_end"),
+        Index("ix_briefings_stale", "stale"),
+    )
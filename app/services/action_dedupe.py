@@ -0,0 +1,189 @@
+import random
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import FrozenSet, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# MinHash LSH: 10 bands of 3 rows. Two actions become candidates with
+# probability 1 - (1 - J^3)^10: 99.9% at J=0.8, 8% at J=0.2
+BANDS = 10
+ROWS = 3
+MASK64 = (1 << 64) - 1
+# Fixed seed so the permutations are the same everywhere; the shingle hashes
+# themselves use hash(), which is per process, like the index
+_rng = random.Random(0x5EED)
+PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(BANDS * ROWS)]
+
+merged_total = registry.counter(
+    "braindump_action_duplicates_merged_total", "Actions not inserted because a near-identical one exists")
+
+# Turkish dotted/dotless i, before lower() gets them wrong
+_TR_CASE = str.maketrans({"I": "ı", "İ": "i"})
+
+
+def normalize(text: str) -> list:
+    """Lowercased words without diacritics: "Süt AL!" and "sut al" look the same."""
+    text = unicodedata.normalize("NFKD", (text or "").translate(_TR_CASE).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c)).replace("ı", "i")
+    return re.findall(r"\w+", text)
+
+
+def shingles(text: str) -> FrozenSet[str]:
+    # Character trigrams per word: suffixes ("sütü", "sütünü") only change a few of them
+    grams = set()
+    for word in normalize(text):
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def minhash(features) -> tuple:
+    """BANDS * ROWS min-values, one per permutation of the feature hashes."""
+    hashes = [hash(f) & MASK64 for f in features]
+    return tuple(min([h * a + b & MASK64 for h in hashes]) for a, b in PERMUTATIONS)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    type: str
+    signature: tuple
+    shingles: FrozenSet[str]
+    datetime_iso: Optional[datetime]
+
+    def bands(self):
+        return [(self.type, i, self.signature[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+
+def fingerprint(type: str, content: str, datetime_iso: Optional[datetime] = None) -> Optional[Fingerprint]:
+    grams = shingles(content)
+    if not grams:
+        return None
+    if datetime_iso is not None and datetime_iso.tzinfo is not None:
+        datetime_iso = datetime_iso.replace(tzinfo=None)  # stored as naive UTC
+    return Fingerprint(type=type, signature=minhash(grams), shingles=grams, datetime_iso=datetime_iso)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH over the actions created in the last ACTION_DEDUPE_WINDOW_HOURS.
+
+    Each action's MinHash signature (over character trigrams) is split into
+    bands; an insert only compares against entries of the same type that
+    share a band, then confirms with the exact trigram Jaccard similarity, so
+    a lookup costs a few dict hits regardless of table size. Dated actions
+    also have to be within ACTION_DEDUPE_TIME_TOLERANCE_MINUTES of each other:
+    "meeting at 3 tomorrow" and "meeting at 3 on Friday" are not duplicates.
+
+    Per process, filled lazily from the DB on first use. A duplicate stored
+    by another process in the meantime is not seen.
+    """
+
+    def __init__(self, window_hours: float = None, min_similarity: float = None, tolerance_minutes: float = None,
+                 max_entries: int = None):
+        self.window = timedelta(hours=settings.ACTION_DEDUPE_WINDOW_HOURS if window_hours is None else window_hours)
+        self.min_similarity = (settings.ACTION_DEDUPE_MIN_SIMILARITY
+                               if min_similarity is None else min_similarity)
+        self.tolerance = timedelta(minutes=settings.ACTION_DEDUPE_TIME_TOLERANCE_MINUTES
+                                   if tolerance_minutes is None else tolerance_minutes)
+        self.max_entries = settings.ACTION_DEDUPE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # id -> (created_at, Fingerprint)
+        self._buckets = defaultdict(set)  # (type, band, value) -> ids
+        # Reentrant: action_crud holds it from lookup to commit so two threads can't both insert.
+        # Callers on the event loop (run_sync) share one thread: pipeline.store_lock covers those
+        self.lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now: datetime):
+        cutoff = now - self.window
+        while self._entries:
+            action_id, (created_at, _) = next(iter(self._entries.items()))
+            if created_at >= cutoff:
+                break
+            self.remove(action_id)
+
+    def _same_time(self, a: Optional[datetime], b: Optional[datetime]) -> bool:
+        if a is None or b is None:
+            return a is b
+        return abs(a - b) <= self.tolerance
+
+    def is_duplicate(self, a: Fingerprint, b: Fingerprint) -> bool:
+        return (a.type == b.type and self._same_time(a.datetime_iso, b.datetime_iso)
+                and jaccard(a.shingles, b.shingles) >= self.min_similarity)
+
+    def find(self, fp: Fingerprint, now: datetime = None) -> Optional[int]:
+        """Id of the most similar indexed action, or None."""
+        with self.lock:
+            self._expire(now or datetime.utcnow())
+            candidates = set()
+            for band in fp.bands():
+                candidates.update(self._buckets.get(band, ()))
+            best = None
+            for action_id in candidates:
+                known = self._entries[action_id][1]
+                if not self.is_duplicate(known, fp):
+                    continue
+                similarity = jaccard(known.shingles, fp.shingles)
+                if best is None or similarity > best[0]:
+                    best = (similarity, action_id)
+            return best[1] if best else None
+
+    def load_once(self, rows):
+        """Fills the index from rows() -> (id, type, content, datetime_iso, created_at), oldest first, once."""
+        with self.lock:
+            if self.loaded:
+                return
+            for action_id, type, content, datetime_iso, created_at in rows():
+                fp = fingerprint(type, content, datetime_iso)
+                if fp is not None:
+                    self.add(action_id, fp, created_at)
+            self.loaded = True
+
+    def add(self, action_id: int, fp: Fingerprint, created_at: datetime = None):
+        with self.lock:
+            self.remove(action_id)
+            self._entries[action_id] = (created_at or datetime.utcnow(), fp)
+            for band in fp.bands():
+                self._buckets[band].add(action_id)
+            while len(self._entries) > self.max_entries:
+                self.remove(next(iter(self._entries)))
+
+    def remove(self, action_id: int):
+        with self.lock:
+            entry = self._entries.pop(action_id, None)
+            if entry is None:
+                return
+            for band in entry[1].bands():
+                ids = self._buckets.get(band)
+                if ids is not None:
+                    ids.discard(action_id)
+                    if not ids:
+                        del self._buckets[band]
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.loaded = False
+
+
+index = NearDuplicateIndex()
+
+registry.register_collector(lambda: [
+    ("braindump_action_dedupe_index_size", "gauge", "Recent actions held in the near-duplicate index",
+     [({}, len(index))]),
+])
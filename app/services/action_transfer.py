@@ -0,0 +1,144 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Tuple, Union
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.crud import action_crud
+from app.models.schemas import ActionImport, ImportResult, ImportRowError
+from app.services.pipeline import stored
+
+EXPORT_FIELDS = [column.key for column in action_crud.EXPORT_COLUMNS]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_chunks(format: str, **filters) -> Iterator[str]:
+    """
+    Blocking generator (StreamingResponse runs it in a thread), one chunk per
+    ACTION_EXPORT_BATCH rows. Its own session, open exactly as long as the response.
+    """
+    db = SessionLocal()
+    try:
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            for batch in action_crud.iter_action_batches(db, settings.ACTION_EXPORT_BATCH, **filters):
+                writer.writerows([_plain(v) for v in row] for row in batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()  # header of an empty export
+        else:
+            for batch in action_crud.iter_action_batches(db, settings.ACTION_EXPORT_BATCH, **filters):
+                yield "".join(
+                    json.dumps(dict(zip(EXPORT_FIELDS, map(_plain, row))), ensure_ascii=False) + "\n"
+                    for row in batch
+                )
+    finally:
+        db.close()
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decoded lines (with their newline) of a byte stream; BOM dropped, memory one line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+Record = Tuple[int, Union[dict, str]]  # (line number, fields or an error message)
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    line_no = 0
+    async for line in _lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        yield line_no, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """Header row first. Quoted fields may span lines; empty cells mean null."""
+    header = None
+    record, record_line, line_no = "", 0, 0
+    async for line in _lines(chunks):
+        line_no += 1
+        if not record:
+            record_line = line_no
+        record += line
+        # An odd number of quotes so far means a quoted field continues on the next line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            continue
+        if len(fields) != len(header):
+            yield record_line, f"Expected {len(header)} columns, got {len(fields)}"
+            continue
+        yield record_line, {name: value for name, value in zip(header, fields) if value != ""}
+    if record.strip():
+        yield record_line, "Unterminated quoted field"
+
+
+async def import_records(records: AsyncIterator[Record]) -> ImportResult:
+    """
+    Validates every record and inserts the valid ones ACTION_IMPORT_BATCH per
+    transaction. Invalid rows are skipped and reported, they don't abort the import.
+    """
+    result = ImportResult(imported=0, skipped=0, errors=[])
+    batch: List[ActionImport] = []
+
+    def reject(line: int, error: str):
+        result.skipped += 1
+        if len(result.errors) < settings.ACTION_IMPORT_MAX_ERRORS:
+            result.errors.append(ImportRowError(line=line, error=error))
+
+    async with AsyncSessionLocal() as db:
+        async def flush():
+            ids = await db.run_sync(action_crud.import_actions, batch)
+            # Reminders and briefings pick up whatever landed in their window
+            stored(ids, batch)
+            result.imported += len(ids)
+            batch.clear()
+
+        async for line, record in records:
+            if isinstance(record, str):
+                reject(line, record)
+                continue
+            try:
+                batch.append(ActionImport.model_validate(record))
+            except ValidationError as e:
+                reject(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            if len(batch) >= settings.ACTION_IMPORT_BATCH:
+                await flush()
+        if batch:
+            await flush()
+    return result
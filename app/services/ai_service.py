@@ -1,65 +1,140 @@
-import google.generativeai as genai
+import asyncio
+import io
 import json
+import threading
+import time
 from datetime import datetime, timezone
-from app.core.config import settings
+from app.core.metrics import record_tokens, registry, stage_seconds, timed
 from app.models.schemas import BrainDumpResponse
-import time
-import re
+from app.services import audio_preprocess, image_preprocess
+from app.services.audio_preprocess import preprocess_audio
+from app.services.image_preprocess import PerceptualIndex, preprocess_image
+from app.services.model_backend import ModelBackend, ModelResponse, get_backend
+from app.services.model_policy import ModelPolicy
+from app.services.micro_batcher import MicroBatcher
+from app.services.response_parser import (
+    IncrementalDumpParser, parse_action, parse_brain_dump, parse_brain_dump_obj, repair_json, strip_fences
+)
+from app.core.config import settings
+from app.services.result_cache import ResultCache, result_cache, hash_bytes, hash_file
+from app.services.upload_manager import UploadManager, collect_metrics as collect_upload_metrics
+
+# Bump whenever the system prompts change so cached results are invalidated
+PROMPT_VERSION = "1"
 
 class AIService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Try to use a stable model name suitable for the API key tier
-        # Updated to use stable aliases which should have quota
-        self.model_flash = genai.GenerativeModel('gemini-flash-latest')
-        self.model_pro = genai.GenerativeModel('gemini-pro-latest')
-
-    async def process_audio(self, audio_file_path: str) -> BrainDumpResponse:
+    def __init__(self, backend: ModelBackend = None, cache: ResultCache = None, policy: ModelPolicy = None):
+        # All model traffic goes through an async backend so nothing here blocks the event loop.
+        # Built on first use (or by warm_up) so importing this module stays cheap
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.cache = cache if cache is not None else result_cache
+        self.policy = policy or ModelPolicy()
+        self.text_batcher = None
+        if settings.MICRO_BATCH_ENABLED:
+            self.text_batcher = MicroBatcher(self._process_text_batch, settings.MICRO_BATCH_MAX_SIZE,
+                                             settings.MICRO_BATCH_MAX_WAIT_MS)
+        self.batch_fallbacks = 0
+        self.image_index = PerceptualIndex()
+        self.uploads = UploadManager(lambda: self.backend)
+
+    @property
+    def backend(self) -> ModelBackend:
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = get_backend()
+        return self._backend
+
+    async def warm_up(self):
+        # Provider SDK import + client setup, off the event loop
+        await asyncio.to_thread(lambda: self.backend)
+        if settings.AUDIO_PREPROCESS_ENABLED and audio_preprocess.AVAILABLE:
+            await asyncio.to_thread(audio_preprocess.load_deps)
+        if settings.IMAGE_PREPROCESS_ENABLED and image_preprocess.AVAILABLE:
+            await asyncio.to_thread(image_preprocess.load_deps)
+
+    async def _upload(self, kind: str, file, mime_type: str = None, content_hash: str = None,
+                      preprocess: bool = True):
+        """
+        Returns the remote file for this content, uploading (and pre-processing)
+        it only when no valid upload of the same content exists yet.
+        """
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(hash_file, file)
+        variant = "pre" if (kind == "audio" and settings.AUDIO_PREPROCESS_ENABLED and audio_preprocess.AVAILABLE) \
+            or (kind == "image" and settings.IMAGE_PREPROCESS_ENABLED and image_preprocess.AVAILABLE) else "raw"
+        return await self.uploads.get_or_upload(
+            f"{kind}:{content_hash}:{variant}",
+            lambda: self._prepare_and_upload(kind, file, mime_type, preprocess)
+        )
+
+    async def _prepare_and_upload(self, kind: str, file, mime_type: str = None, preprocess: bool = True):
+        if preprocess and kind == "audio":
+            # Mono 16 kHz Opus without the silences: smaller upload, fewer audio tokens
+            with timed("audio_preprocess"):
+                processed = await asyncio.to_thread(preprocess_audio, file)
+            if processed is not None:
+                audio_preprocess.report(processed)
+                file, mime_type = io.BytesIO(processed.data), processed.mime_type
+        elif preprocess and kind == "image":
+            processed = await self._preprocess_image(file)
+            if processed is not None and processed.data is not None:
+                file, mime_type = io.BytesIO(processed.data), processed.mime_type
+        with timed("model_upload", kind=kind):
+            return await self.backend.upload(file, mime_type=mime_type)
+
+    async def _preprocess_image(self, image_file):
+        # Upright, metadata-free, at most IMAGE_MAX_EDGE px: receipts don't need 12 MP
+        with timed("image_preprocess"):
+            processed = await asyncio.to_thread(preprocess_image, image_file)
+        if processed is not None:
+            image_preprocess.report(processed)
+        return processed
+
+    async def process_audio(self, audio_file, content_hash: str = None, mime_type: str = None) -> BrainDumpResponse:
+        # audio_file is a path or a binary stream (see SpooledUpload.source)
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(hash_file, audio_file)
+        return await self._cached("audio", content_hash, self._process_audio, audio_file, mime_type, content_hash)
+
+    async def process_text(self, text: str) -> BrainDumpResponse:
+        process = self.text_batcher.submit if self.text_batcher else self._process_text
+        return await self._cached("text", hash_bytes(text.encode("utf-8")), process, text)
+
+    async def process_image(self, image_file, content_hash: str = None, mime_type: str = None) -> BrainDumpResponse:
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(hash_file, image_file)
+        return await self._cached("image", content_hash, self._process_image, image_file, mime_type, content_hash)
+
+    async def _cached(self, kind: str, content_hash: str, func, *args) -> BrainDumpResponse:
+        if self.cache is None:
+            return await func(*args)
+        key = self.cache.make_key(kind, PROMPT_VERSION, content_hash)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = await func(*args)
+        await self.cache.set(key, result)
+        return result
+
+    async def _process_audio(self, audio_file, mime_type: str = None, content_hash: str = None) -> BrainDumpResponse:
         """
         Uploads audio to Gemini and gets structured JSON response.
         """
-        # Upload the file to Gemini
-        # Note: In a real prod scenario, we might manage file lifecycle (delete after use).
-        # For MVP, we upload and process.
-        sample_audio = genai.upload_file(audio_file_path)
+        # Upload the file to Gemini (or reuse an earlier upload of the same audio,
+        # the upload manager deletes remote files once they go idle)
+        sample_audio = await self._upload("audio", audio_file, mime_type, content_hash)
         
         # Ensure UTC time is used for consistency, explicitly formatted with Z
         current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        system_prompt = self._get_system_prompt(current_time)
         
-        # Try with Flash first, fallback to Pro
-        # Implementing simple retry logic for rate limits
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.model_flash.generate_content(
-                    [system_prompt, sample_audio],
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                break # Success
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "Quota exceeded" in error_str:
-                    print(f"Rate limit hit, waiting 5s... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(5)
-                    if attempt == max_retries - 1:
-                        # Last attempt failed, try fallback
-                        print("Primary model exhausted, trying fallback...")
-                        response = self.model_pro.generate_content(
-                            [system_prompt, sample_audio],
-                            generation_config={"response_mime_type": "application/json"}
-                        )
-                else:
-                    print(f"Primary model error: {e}, switching to fallback immediately.")
-                    response = self.model_pro.generate_content(
-                        [system_prompt, sample_audio],
-                        generation_config={"response_mime_type": "application/json"}
-                    )
-                    break
-
-        # Parse JSON
-        return self._parse_response(response)
+        # Flash first, retries/backoff/fallback to Pro are handled by the shared policy
+        return await self.policy.generate(self.backend, "audio", [system_prompt, sample_audio], json_mode=True,
+                                          parse=self._parse_response)
 
-    async def process_text(self, text: str) -> BrainDumpResponse:
+    async def _process_text(self, text: str) -> BrainDumpResponse:
         """
         Process text directly without audio.
         """
@@ -67,80 +142,212 @@ class AIService:
         
         system_prompt = self._get_system_prompt(current_time)
         
-        # Try with Flash first, fallback to Pro
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.model_flash.generate_content(
-                    [system_prompt, text],
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                break
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "Quota exceeded" in error_str:
-                    print(f"Rate limit hit, waiting 5s... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(5)
-                    if attempt == max_retries - 1:
-                         # Last attempt failed, try fallback
-                        print("Primary model exhausted, trying fallback...")
-                        response = self.model_pro.generate_content(
-                            [system_prompt, text],
-                            generation_config={"response_mime_type": "application/json"}
-                        )
-                else:
-                    print(f"Primary model error: {e}, switching to fallback immediately.")
-                    response = self.model_pro.generate_content(
-                        [system_prompt, text],
-                        generation_config={"response_mime_type": "application/json"}
-                    )
-                    break
-        
-        return self._parse_response(response)
+        # Flash first, retries/backoff/fallback to Pro are handled by the shared policy
+        # Parsing happens inside the policy so a hedged race only accepts a valid BrainDumpResponse
+        return await self.policy.generate(self.backend, "text", [system_prompt, text], json_mode=True,
+                                          parse=self._parse_response)
+
+    async def _process_text_batch(self, texts: list) -> list:
+        """
+        Sends several text dumps in one prompt so the static instructions are paid
+        for once, then splits the answer back per item. Items missing from or
+        malformed in the batched output are re-run one by one.
+        """
+        if len(texts) == 1:
+            return await asyncio.gather(self._process_text(texts[0]), return_exceptions=True)
+
+        current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        system_prompt = self._get_batch_system_prompt(current_time, len(texts))
+        items = "\n\n".join(f"[ITEM {i}]\n{text}" for i, text in enumerate(texts))
 
-        return self._parse_response(response)
+        results = [None] * len(texts)
+        try:
+            response = await self.policy.generate(self.backend, "text", [system_prompt, items], json_mode=True)
+            for entry in json.loads(repair_json(strip_fences(response.text))).get("results", []):
+                try:
+                    index = int(entry.get("id"))
+                    if 0 <= index < len(texts) and results[index] is None:
+                        results[index] = parse_brain_dump_obj(entry)
+                except Exception as e:
+                    print(f"Dropping malformed batch item: {e}")
+        except Exception as e:
+            print(f"Batched call failed, falling back to single calls: {e}")
 
-    async def process_image(self, image_file_path: str) -> BrainDumpResponse:
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            self.batch_fallbacks += len(missing)
+            retried = await asyncio.gather(*[self._process_text(texts[i]) for i in missing], return_exceptions=True)
+            for i, result in zip(missing, retried):
+                results[i] = result
+        return results
+
+    async def _process_image(self, image_file, mime_type: str = None, content_hash: str = None) -> BrainDumpResponse:
         """
         Uploads an image to Gemini and gets structured JSON response.
         """
+        processed = await self._preprocess_image(image_file)
+        if processed is not None:
+            # Same receipt photographed twice: reuse the earlier answer
+            prior = self.image_index.find(processed.phash, processed.thumbnail)
+            if prior is not None:
+                return prior
+            if processed.data is not None:
+                image_file, mime_type = io.BytesIO(processed.data), processed.mime_type
+
         # Upload the file to Gemini
         # MIME type inference is usually automatic by file extension
-        sample_image = genai.upload_file(image_file_path)
+        sample_image = await self._upload("image", image_file, mime_type, content_hash, preprocess=False)
         
         current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
         system_prompt = self._get_vision_system_prompt(current_time)
         
-        # Try with Flash (it supports vision)
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.model_flash.generate_content(
-                    [system_prompt, sample_image],
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                break
-            except Exception as e:
-                print(f"Vision error (Attempt {attempt+1}): {e}")
-                time.sleep(2)
-                if attempt == max_retries - 1:
-                    # Fallback to Pro if Flash fails (Pro also supports vision)
-                    response = self.model_pro.generate_content(
-                        [system_prompt, sample_image],
-                        generation_config={"response_mime_type": "application/json"}
-                    )
-        
-        return self._parse_response(response)
+        # Flash supports vision, Pro is the fallback (Pro also supports vision)
+        result = await self.policy.generate(self.backend, "image", [system_prompt, sample_image], json_mode=True,
+                                            parse=self._parse_response)
+        if processed is not None:
+            self.image_index.add(processed.phash, processed.thumbnail, result)
+        return result
+
+    async def stream_text(self, text: str, result: BrainDumpResponse):
+        """
+        Streaming variant of process_text: yields each ProcessedAction as soon as
+        its JSON object is complete. `result` collects the summary and all actions.
+        """
+        current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        system_prompt = self._get_system_prompt(current_time)
+        async for action in self._stream_actions("text", [system_prompt, text], result):
+            yield action
+
+    async def stream_audio(self, audio_file, result: BrainDumpResponse, mime_type: str = None,
+                           content_hash: str = None):
+        sample_audio = await self._upload("audio", audio_file, mime_type, content_hash)
+        current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        system_prompt = self._get_system_prompt(current_time)
+        async for action in self._stream_actions("audio", [system_prompt, sample_audio], result):
+            yield action
+
+    async def stream_image(self, image_file, result: BrainDumpResponse, mime_type: str = None,
+                           content_hash: str = None):
+        sample_image = await self._upload("image", image_file, mime_type, content_hash)
+        current_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        system_prompt = self._get_vision_system_prompt(current_time)
+        async for action in self._stream_actions("image", [system_prompt, sample_image], result):
+            yield action
+
+    async def _stream_actions(self, endpoint: str, contents: list, result: BrainDumpResponse):
+        parser = IncrementalDumpParser()
+        model = self.policy.pick_model()
+        usage = ModelResponse(text="", model=model)
+        try:
+            await self.policy.acquire(model)
+            started = time.perf_counter()
+            async for chunk in self.policy.stream_with_deadline(
+                    model, self.backend.stream(model, contents, json_mode=True, result=usage)):
+                for raw_action in parser.feed(chunk):
+                    action = parse_action(raw_action)
+                    if action is not None:
+                        result.actions.append(action)
+                        yield action
+        except Exception as e:
+            self.policy.record(model, e)
+            if result.actions:
+                raise
+            # Nothing sent to the client yet: the regular path can still retry and fall back
+            print(f"{endpoint}: stream failed before the first action ({e}), using the regular call")
+            full = await self.policy.generate(self.backend, endpoint, contents, json_mode=True,
+                                              parse=self._parse_response)
+            result.summary = full.summary
+            for action in full.actions:
+                result.actions.append(action)
+                yield action
+            return
+        finally:
+            # Client disconnected mid-stream: no outcome, don't leave the breaker waiting on it
+            self.policy.release(model)
+        self.policy.record(model)
+        stage_seconds.observe(time.perf_counter() - started, stage="model_stream", model=model)
+        record_tokens(usage)
+
+        if not parser.found_actions:
+            # Unexpected layout: fall back to the tolerant whole-document parser
+            full = self._parse_response(ModelResponse(text=parser.text, model=model))
+            for action in full.actions:
+                result.actions.append(action)
+                yield action
+            result.summary = full.summary
+            return
+        result.summary = parser.summary or ""
 
     async def answer_question(self, context_actions: list, question: str) -> str:
         try:
-            # Flatten context for the LLM
-            context_str = "\n".join([
-                f"- [{a.created_at.strftime('%Y-%m-%d %H:%M')}] {a.type} ({a.category or 'General'}): {a.content}"
-                for a in context_actions
-            ])
+            prompt = self._get_answer_prompt(context_actions, question)
+            response = await self.policy.generate(self.backend, "ask", [prompt])
+            return response.text.strip()
+        except Exception as e:
+            print(f"Q&A Error: {e}")
+            return "Üzgünüm, şu an cevap veremiyorum."
 
-            prompt = f"""
+    async def stream_answer(self, context_actions: list, question: str, result: ModelResponse = None):
+        """
+        Same prompt as answer_question, yielded chunk by chunk as the model writes it.
+        `result` collects the full text and token usage once the stream ends.
+        """
+        prompt = self._get_answer_prompt(context_actions, question)
+        # Chunks may already be on the wire, so no retries here: pick a healthy model once
+        model = self.policy.pick_model()
+        result = result if result is not None else ModelResponse(text="", model=model)
+        try:
+            await self.policy.acquire(model)
+            started = time.perf_counter()
+            async for chunk in self.policy.stream_with_deadline(
+                    model, self.backend.stream(model, [prompt], result=result)):
+                yield chunk
+        except Exception as e:
+            self.policy.record(model, e)
+            raise
+        finally:
+            self.policy.release(model)
+        self.policy.record(model)
+        stage_seconds.observe(time.perf_counter() - started, stage="model_stream", model=model)
+        record_tokens(result)
+
+    async def write_briefing(self, actions: list, day: str, tz, name: str = None) -> str:
+        """Morning briefing text for `day` (raises on model failure, the caller keeps the old one)."""
+        prompt = self._get_briefing_prompt(actions, day, tz, name)
+        response = await self.policy.generate(self.backend, "briefing", [prompt])
+        return response.text.strip()
+
+    def _get_briefing_prompt(self, actions: list, day: str, tz, name: str = None) -> str:
+        lines = []
+        for a in actions:
+            when = (a.datetime_iso.replace(tzinfo=timezone.utc).astimezone(tz).strftime('%H:%M')
+                    if a.datetime_iso else "-")
+            lines.append(f"- [{when}] {a.type.value} ({a.priority or 'MEDIUM'}): {a.content}")
+        items_str = "\n".join(lines) or "(nothing planned)"
+
+        return f"""
+            You are a helpful personal assistant called "BrainDump".
+            Write the user's morning briefing for {day}{f" (the user's name is {name})" if name else ""}.
+
+            TODAY'S ITEMS (local time, "-" = no time):
+            {items_str}
+
+            INSTRUCTIONS:
+            1. Greet the user briefly, then go through the day in time order: events, reminders, then open TODOs.
+            2. Point out anything HIGH priority or tightly scheduled.
+            3. Use ONLY the items above, don't invent anything. If there are none, say the day looks free.
+            4. At most 6 short sentences, friendly tone, plain text (no markdown).
+            5. Reply in Turkish.
+            """
+
+    def _get_answer_prompt(self, context_actions: list, question: str) -> str:
+        # Flatten context for the LLM
+        context_str = "\n".join([
+            f"- [{a.created_at.strftime('%Y-%m-%d %H:%M')}] {a.type} ({a.category or 'General'}): {a.content}"
+            for a in context_actions
+        ])
+
+        return f"""
             You are a helpful personal assistant called "BrainDump".
             You have access to the user's recent logs and actions.
 
@@ -157,12 +364,6 @@ class AIService:
             4. Reply in Turkish (unless the user asks in English).
             """
 
-            response = await self.model_flash.generate_content_async(prompt)
-            return response.text.strip()
-        except Exception as e:
-            print(f"Q&A Error: {e}")
-            return "Üzgünüm, şu an cevap veremiyorum."
-
     def _get_system_prompt(self, current_time: str) -> str:
         return f"""
         You are the intelligence behind "BrainDump". 
@@ -215,6 +416,19 @@ class AIService:
         }}
         """
 
+    def _get_batch_system_prompt(self, current_time: str, count: int) -> str:
+        return self._get_system_prompt(current_time) + f"""
+        BATCH MODE:
+        The input contains {count} independent dumps, each starting with a "[ITEM n]" line.
+        Process every item on its own, exactly as described above, and never mix actions between items.
+        Instead of the schema above, return ONLY this JSON object with one entry per item:
+        {{
+          "results": [
+            {{ "id": n, "summary": "...", "actions": [ ... ] }}
+          ]
+        }}
+        """
+
     def _get_vision_system_prompt(self, current_time: str) -> str:
         return f"""
         You are the visual cortex of "BrainDump".
@@ -256,20 +470,46 @@ class AIService:
 
     def _parse_response(self, response) -> BrainDumpResponse:
         try:
-            # Handle potential markdown code blocks
-            text = response.text
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            result = json.loads(text)
-            return BrainDumpResponse(**result)
+            return parse_brain_dump(response.text)
         except Exception as e:
             print(f"Error parsing AI response: {e}")
             print(f"Raw response: {response.text}")
             raise e
 
 ai_service = AIService()
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _collect_metrics():
+    stats = ai_service.policy.stats()
+    families = collect_upload_metrics(ai_service.uploads) + [
+        ("braindump_model_retries_total", "counter", "Retries on the primary model", [({}, stats["retries"])]),
+        ("braindump_model_fallbacks_total", "counter", "Calls that ended up on the fallback model",
+         [({}, stats["fallbacks"])]),
+        ("braindump_model_short_circuited_total", "counter", "Calls sent straight to the fallback by the breaker",
+         [({}, stats["short_circuited"])]),
+        ("braindump_model_timeouts_total", "counter", "Model calls that hit their deadline",
+         [({"model": model}, count) for model, count in stats["timeouts"].items()]),
+        ("braindump_model_hedges_total", "counter", "Hedged calls by winner", [
+            ({"winner": "none"}, stats["hedges"] - stats["hedge_wins"] - stats["primary_wins"]),
+            ({"winner": "primary"}, stats["primary_wins"]),
+            ({"winner": "hedge"}, stats["hedge_wins"]),
+        ]),
+        ("braindump_model_breaker_state", "gauge", "Primary model breaker: 0 closed, 1 half-open, 2 open",
+         [({}, _BREAKER_STATES[stats["breaker_state"]])]),
+        ("braindump_model_p95_seconds", "gauge", "Rolling p95 latency of successful calls",
+         [({"model": model}, p95) for model, p95 in stats["p95_seconds"].items()]),
+        ("braindump_batch_fallbacks_total", "counter", "Batched text items re-run one by one",
+         [({}, ai_service.batch_fallbacks)]),
+    ]
+    if ai_service.text_batcher is not None:
+        batcher = ai_service.text_batcher.stats()
+        families.append(("braindump_micro_batches_total", "counter", "Batched text model calls",
+                         [({}, batcher["batches"])]))
+        families.append(("braindump_micro_batch_items_total", "counter", "Text dumps sent through batching",
+                         [({}, batcher["items"])]))
+    return families
+
+
+registry.register_collector(_collect_metrics)
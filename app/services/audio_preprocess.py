@@ -0,0 +1,175 @@
+import importlib.util
+import io
+import os
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Optional: without numpy + PyAV the raw upload goes to the model unchanged.
+# Both are imported on first use, they would double the app's import time
+AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("av", "numpy"))
+av = np = None
+
+
+def load_deps():
+    global av, np
+    if av is None:
+        import av as _av
+        import numpy as _np
+        av, np = _av, _np
+
+bytes_saved_total = registry.counter(
+    "braindump_audio_preprocess_bytes_saved_total", "Upload bytes removed by audio pre-processing")
+seconds_saved_total = registry.counter(
+    "braindump_audio_preprocess_seconds_saved_total", "Audio seconds removed by silence trimming")
+
+
+@dataclass
+class PreprocessedAudio:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    original_seconds: float
+    seconds: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    @property
+    def seconds_saved(self) -> float:
+        return self.original_seconds - self.seconds
+
+
+def _size(source: Union[str, BinaryIO]) -> int:
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(position)
+    return size
+
+
+def decode_mono(source: Union[str, BinaryIO], rate: int) -> "np.ndarray":
+    """Decodes any container/codec ffmpeg knows into mono float32 samples at `rate`."""
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=rate)
+    chunks = []
+    with av.open(source, mode="r") as container:
+        stream = container.streams.audio[0]
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().reshape(-1))
+    for out in resampler.resample(None):  # flush
+        chunks.append(out.to_ndarray().reshape(-1))
+    return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def speech_mask(samples: "np.ndarray", rate: int, frame_ms: int = 30) -> "np.ndarray":
+    """
+    Energy VAD, one bool per frame. The threshold adapts to the recording:
+    a margin above its noise floor (20th percentile frame energy), never below
+    an absolute floor so near-digital silence is always cut.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[:count * frame].reshape(count, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 20)
+    threshold = max(noise_floor + settings.AUDIO_VAD_MARGIN_DB, settings.AUDIO_VAD_FLOOR_DB)
+    mask = energy_db > threshold
+
+    # Hangover: keep a little audio around every voiced frame so word edges survive
+    pad = max(1, settings.AUDIO_VAD_PAD_MS // frame_ms)
+    kernel = np.ones(2 * pad + 1, dtype=np.int32)
+    return np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+
+
+def trim_silence(samples: "np.ndarray", rate: int, frame_ms: int = 30) -> "np.ndarray":
+    """
+    Drops leading/trailing silence and shortens internal pauses longer than
+    AUDIO_SILENCE_MAX_MS down to AUDIO_SILENCE_KEEP_MS.
+    """
+    mask = speech_mask(samples, rate, frame_ms)
+    if not mask.any():
+        return samples[:0]
+    frame = max(1, rate * frame_ms // 1000)
+    voiced = np.flatnonzero(mask)
+    first, last = voiced[0], voiced[-1]
+    keep = mask.copy()
+    keep[first:last + 1] = True
+
+    # Silent runs inside the speech: [start, end) frame indexes
+    inner = ~mask[first:last + 1]
+    edges = np.diff(np.concatenate(([0], inner.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1) + first, np.flatnonzero(edges == -1) + first
+    max_frames = settings.AUDIO_SILENCE_MAX_MS // frame_ms
+    keep_frames = settings.AUDIO_SILENCE_KEEP_MS // frame_ms
+    for start, end in zip(starts, ends):
+        if end - start > max_frames:
+            half = keep_frames // 2
+            keep[start + half:end - (keep_frames - half)] = False
+
+    keep[:first] = False
+    keep[last + 1:] = False
+    return samples[:len(keep) * frame].reshape(len(keep), frame)[keep].reshape(-1)
+
+
+def encode_opus(samples: "np.ndarray", rate: int, bitrate: int) -> bytes:
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=rate)
+        stream.bit_rate = bitrate
+        stream.layout = "mono"
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="flt", layout="mono")
+        frame.sample_rate = rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def preprocess_audio(source: Union[str, BinaryIO]) -> Optional[PreprocessedAudio]:
+    """
+    Blocking (run it in a thread). Decode -> mono -> resample -> VAD trim -> Opus.
+    Returns None when the stage is off, the deps are missing, the input can't
+    be decoded or the result would not be smaller; the caller then uploads
+    the original. Streams are rewound either way.
+    """
+    if not (settings.AUDIO_PREPROCESS_ENABLED and AVAILABLE):
+        return None
+    rate = settings.AUDIO_TARGET_SAMPLE_RATE
+    try:
+        load_deps()
+        original_bytes = _size(source)
+        samples = decode_mono(source, rate)
+        original_seconds = len(samples) / rate
+        trimmed = trim_silence(samples, rate)
+        if len(trimmed) == 0:
+            # All silence by our measure: let the model decide rather than sending nothing
+            trimmed = samples
+        data = encode_opus(trimmed, rate, settings.AUDIO_BITRATE)
+    except Exception as e:
+        print(f"Audio pre-processing skipped: {e}")
+        return None
+    finally:
+        if not isinstance(source, str):
+            source.seek(0)
+
+    if len(data) >= original_bytes:
+        return None
+    return PreprocessedAudio(data=data, mime_type="audio/ogg", original_bytes=original_bytes,
+                             original_seconds=original_seconds, seconds=len(trimmed) / rate)
+
+
+def report(result: PreprocessedAudio):
+    bytes_saved_total.inc(result.bytes_saved)
+    seconds_saved_total.inc(result.seconds_saved)
+    print(f"Audio pre-processing: {result.original_bytes} -> {len(result.data)} bytes "
+          f"(-{result.bytes_saved}), {result.original_seconds:.1f}s -> {result.seconds:.1f}s "
+          f"(-{result.seconds_saved:.1f}s)")
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+
+class BackgroundLoop:
+    """
+    One asyncio task that calls _step(now) over and over, sleeping for the
+    seconds it returns. Writers hand over ids of freshly stored actions with
+    _notify(), which wakes the loop right away; _step() picks them up with
+    _take_ids(). A failing step is logged and retried after error_delay(),
+    with the ids it took handed back for the retry.
+    """
+
+    name = "Background loop"
+
+    def __init__(self):
+        self._new_ids: List[int] = []
+        self._taken: List[int] = []  # ids the current step took, restored if it fails
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._new_ids = []
+
+    def wake(self):
+        if self._task is not None:
+            self._wake.set()
+
+    def _notify(self, ids: Iterable[int]):
+        ids = list(ids)
+        if self._task is None or not ids:
+            return
+        self._new_ids.extend(ids)
+        self._wake.set()
+
+    def _take_ids(self) -> List[int]:
+        ids, self._new_ids = self._new_ids, []
+        self._taken.extend(ids)
+        return ids
+
+    def error_delay(self) -> float:
+        return 5.0
+
+    async def _step(self, now: datetime) -> float:
+        raise NotImplementedError
+
+    async def _run(self):
+        while True:
+            failed = False
+            try:
+                delay = await self._step(datetime.utcnow())
+            except Exception as e:
+                print(f"{self.name} error: {e}")
+                delay = self.error_delay()
+                failed = True
+                # Hand the ids back; they are retried after the error delay, not in a tight loop
+                self._new_ids[:0] = self._taken
+            self._taken = []
+            self._wake.clear()
+            if self._new_ids and not failed:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
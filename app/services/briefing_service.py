@@ -0,0 +1,241 @@
+import json
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import registry
+from app.crud import action_crud
+from app.models import sql_models
+from app.models.schemas import ActionResponse, BriefingResponse
+from app.services.background_loop import BackgroundLoop
+
+briefings_total = registry.counter(
+    "braindump_briefings_generated_total", "Briefing summaries written in the background, by outcome")
+
+
+def user_timezone(user: sql_models.User) -> ZoneInfo:
+    try:
+        return ZoneInfo(user.timezone or settings.DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def parse_briefing_time(value: Optional[str], strict: bool = False) -> dt_time:
+    """Parses "HH:MM"; anything unparseable means 09:00 unless `strict` (then ValueError)."""
+    try:
+        hour, minute = (value or "09:00").split(":")
+        return dt_time(int(hour), int(minute))
+    except ValueError:
+        if strict:
+            raise
+        return dt_time(9, 0)
+
+
+def briefing_day(user: sql_models.User, now: datetime) -> date:
+    """
+    The day whose briefing is current at `now` (naive UTC): the latest one whose
+    morning_briefing_time minus BRIEFING_LEAD_MINUTES has passed in the user's timezone.
+    """
+    local = now.replace(tzinfo=timezone.utc).astimezone(user_timezone(user))
+    local += timedelta(minutes=settings.BRIEFING_LEAD_MINUTES)
+    day = local.date()
+    if local.time() < parse_briefing_time(user.morning_briefing_time):
+        day -= timedelta(days=1)
+    return day
+
+
+def day_window(day: date, tz: ZoneInfo) -> Tuple[datetime, datetime]:
+    """The local day as naive UTC [start, end), like datetime_iso is stored."""
+    start = datetime.combine(day, dt_time(0), tzinfo=tz).astimezone(timezone.utc)
+    end = datetime.combine(day + timedelta(days=1), dt_time(0), tzinfo=tz).astimezone(timezone.utc)
+    return start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+
+def _live_since(now: datetime) -> datetime:
+    # Yesterday's briefing stays the current one until today's is due, so a
+    # briefing can be current up to a day after its window ended
+    return now - timedelta(days=1)
+
+
+def _todo_since(window_start: datetime) -> datetime:
+    return window_start - timedelta(days=settings.BRIEFING_TODO_LOOKBACK_DAYS)
+
+
+def _sort_items(items: List[dict]) -> List[dict]:
+    # Same order as get_briefing_actions: the day in time order, then undated TODOs newest first
+    dated = sorted((i for i in items if i["datetime_iso"]), key=lambda i: (i["datetime_iso"], i["id"]))
+    undated = sorted((i for i in items if not i["datetime_iso"]), key=lambda i: (i["created_at"] or "", i["id"]),
+                     reverse=True)
+    return dated + undated
+
+
+def to_briefing_response(row: sql_models.Briefing) -> BriefingResponse:
+    return BriefingResponse(
+        day=row.day,
+        summary=row.summary,
+        items=json.loads(row.items or "[]"),
+        stale=bool(row.stale),
+        generated_at=row.generated_at,
+    )
+
+
+class BriefingService(BackgroundLoop):
+    """
+    Keeps each user's current morning briefing ready in the `briefings` table,
+    so GET /briefing is a single row read and never waits for the model.
+
+    BRIEFING_LEAD_MINUTES before a user's morning_briefing_time the background
+    loop stores that day's CALENDAR_EVENT/TODO/REMINDER items, then has the
+    model write the summary. Actions stored later are appended to every
+    briefing whose day they fall on right away; the summary is only marked
+    stale and rewritten once no new action has arrived for
+    BRIEFING_REFRESH_DELAY_SECONDS, so a burst of dumps costs one model call.
+    A failed summary isn't retried before BRIEFING_RETRY_SECONDS.
+    """
+
+    name = "Briefing loop"
+
+    def invalidate(self, action_ids: Iterable[int]):
+        """Called after actions are stored; the loop adds them to the briefings they belong to."""
+        self._notify(action_ids)
+
+    def error_delay(self) -> float:
+        return settings.BRIEFING_CHECK_SECONDS
+
+    async def get(self, user: sql_models.User) -> BriefingResponse:
+        """The user's current briefing. Created on the spot (items only) if the loop hasn't yet."""
+        day = briefing_day(user, datetime.utcnow())
+        async with AsyncSessionLocal() as db:
+            row = await self._get_or_create(db, user.id, user_timezone(user), day)
+            response = to_briefing_response(row)
+            waiting = row.retry_at is not None
+        # Just created: have the loop write the summary now (unless the model just failed on it)
+        if response.summary is None and not waiting:
+            self.wake()
+        return response
+
+    async def _step(self, now: datetime) -> float:
+        ids = self._take_ids()
+        if ids:
+            await self._add_actions(ids, now)
+        await self._ensure_current(now)
+        return await self._refresh_stale(now)
+
+    async def _get_or_create(self, db, user_id: int, tz: ZoneInfo, day: date) -> sql_models.Briefing:
+        query = select(sql_models.Briefing).where(
+            sql_models.Briefing.user_id == user_id, sql_models.Briefing.day == day.isoformat())
+        row = await db.scalar(query)
+        if row is not None:
+            return row
+        window_start, window_end = day_window(day, tz)
+        actions = await db.run_sync(action_crud.get_briefing_actions, window_start, window_end,
+                                    _todo_since(window_start), limit=settings.BRIEFING_MAX_ITEMS)
+        items = [ActionResponse.model_validate(a).model_dump(mode="json") for a in actions]
+        row = sql_models.Briefing(user_id=user_id, day=day.isoformat(), window_start=window_start,
+                                  window_end=window_end, items=json.dumps(items, ensure_ascii=False), stale=1)
+        db.add(row)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A request and the loop created it at the same moment
+            await db.rollback()
+            return await db.scalar(query)
+        return row
+
+    async def _ensure_current(self, now: datetime):
+        # Single-user MVP: a handful of rows, fine to walk every minute
+        async with AsyncSessionLocal() as db:
+            users = (await db.scalars(select(sql_models.User))).all()
+            # Plain values: a rollback in _get_or_create would expire the ORM objects
+            due = [(user.id, user_timezone(user), briefing_day(user, now)) for user in users]
+            for user_id, tz, day in due:
+                await self._get_or_create(db, user_id, tz, day)
+
+    async def _add_actions(self, ids: List[int], now: datetime):
+        async with AsyncSessionLocal() as db:
+            actions = (await db.scalars(
+                select(sql_models.Action).where(
+                    sql_models.Action.id.in_(ids),
+                    sql_models.Action.type.in_([t.value for t in action_crud.BRIEFING_TYPES]),
+                )
+            )).all()
+            if not actions:
+                return
+            rows = (await db.scalars(
+                select(sql_models.Briefing).where(sql_models.Briefing.window_end > _live_since(now))
+            )).all()
+            for row in rows:
+                items = json.loads(row.items or "[]")
+                known = {item["id"] for item in items}
+                added = [
+                    ActionResponse.model_validate(a).model_dump(mode="json") for a in actions
+                    if a.id not in known and action_crud.belongs_to_briefing(
+                        a, row.window_start, row.window_end, _todo_since(row.window_start))
+                ]
+                if not added:
+                    continue
+                row.items = json.dumps(_sort_items(items + added)[:settings.BRIEFING_MAX_ITEMS], ensure_ascii=False)
+                row.stale = 1
+                row.updated_at = now
+            await db.commit()
+
+    async def _refresh_stale(self, now: datetime) -> float:
+        """Rewrites summaries that are due; returns the seconds until the next one is."""
+        delay = timedelta(seconds=settings.BRIEFING_REFRESH_DELAY_SECONDS)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(sql_models.Briefing.id, sql_models.Briefing.summary, sql_models.Briefing.updated_at,
+                       sql_models.Briefing.retry_at)
+                .where(sql_models.Briefing.stale == 1, sql_models.Briefing.window_end > _live_since(now))
+            )).all()
+        wait = settings.BRIEFING_CHECK_SECONDS
+        for row_id, summary, updated_at, retry_at in rows:
+            # The first summary is written right away, rewrites wait for the burst to settle
+            ready_at = updated_at + delay if summary is not None else now
+            if retry_at is not None:
+                ready_at = max(ready_at, retry_at)
+            if ready_at <= now:
+                await self._write_summary(row_id, now)
+            else:
+                wait = min(wait, (ready_at - now).total_seconds())
+        return wait
+
+    async def _write_summary(self, row_id: int, now: datetime):
+        from app.services.ai_service import ai_service
+
+        async with AsyncSessionLocal() as db:
+            row = await db.get(sql_models.Briefing, row_id)
+            user = await db.get(sql_models.User, row.user_id)
+            items = [ActionResponse.model_validate(item) for item in json.loads(row.items or "[]")]
+            day, seen = row.day, row.updated_at
+            tz, name = user_timezone(user), user.full_name
+        try:
+            summary = await ai_service.write_briefing(items, day, tz, name)
+        except Exception as e:
+            print(f"Briefing {day} failed: {e}")
+            briefings_total.inc(outcome="failed")
+            # Don't retry every loop pass (or on every GET) while the model is down
+            retry_at = now + timedelta(seconds=settings.BRIEFING_RETRY_SECONDS)
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(sql_models.Briefing).where(sql_models.Briefing.id == row_id)
+                                 .values(retry_at=retry_at))
+                await db.commit()
+            return
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(sql_models.Briefing).where(sql_models.Briefing.id == row_id)
+                             .values(summary=summary, generated_at=now, retry_at=None))
+            # Still stale if more actions were appended while the model was writing
+            await db.execute(update(sql_models.Briefing)
+                             .where(sql_models.Briefing.id == row_id, sql_models.Briefing.updated_at == seen)
+                             .values(stale=0))
+            await db.commit()
+        briefings_total.inc(outcome="ok")
+
+
+briefing_service = BriefingService()
@@ -0,0 +1,175 @@
+import importlib.util
+import io
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.schemas import BrainDumpResponse
+
+# Optional: without Pillow images are uploaded as received. Imported on first use
+AVAILABLE = importlib.util.find_spec("PIL") is not None
+Image = ImageOps = None
+
+bytes_saved_total = registry.counter(
+    "braindump_image_preprocess_bytes_saved_total", "Upload bytes removed by image downscaling/recompression")
+dedupe_hits_total = registry.counter(
+    "braindump_image_dedupe_hits_total", "Images served from a perceptually identical earlier image")
+
+
+def load_deps():
+    global Image, ImageOps
+    if Image is None:
+        from PIL import Image as _Image, ImageOps as _ImageOps
+        Image, ImageOps = _Image, _ImageOps
+
+
+@dataclass
+class PreprocessedImage:
+    data: Optional[bytes]  # None: the re-encode wasn't smaller, upload the original
+    mime_type: Optional[str]
+    phash: int
+    thumbnail: bytes  # 32x32 grayscale, to confirm a hash match
+    original_bytes: int
+    size: tuple
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data) if self.data is not None else 0
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """
+    Difference hash: 64 bits of "is this pixel brighter than its right
+    neighbour" on a tiny grayscale copy. Survives rescaling, recompression and
+    small exposure changes, so two photos of the same receipt land a few bits apart.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def thumbnail(image, size: int = 32) -> bytes:
+    return image.convert("L").resize((size, size), Image.BILINEAR).tobytes()
+
+
+def pixel_difference(a: bytes, b: bytes) -> float:
+    """Mean absolute difference (0-255) between two thumbnails."""
+    return sum(abs(x - y) for x, y in zip(a, b)) / max(1, len(a))
+
+
+def _read(source: Union[str, BinaryIO]) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    try:
+        return source.read()
+    finally:
+        source.seek(0)
+
+
+def preprocess_image(source: Union[str, BinaryIO]) -> Optional[PreprocessedImage]:
+    """
+    Blocking (run it in a thread). Applies the EXIF rotation, drops all
+    metadata, fits the image into IMAGE_MAX_EDGE and re-encodes it as JPEG.
+    Returns None when Pillow is missing, the stage is off or the file can't
+    be decoded; the caller then uploads the original. When the JPEG isn't
+    smaller (small PNG screenshots) `data` is None: the hash and thumbnail
+    are still there for dedupe, but the original is uploaded.
+    """
+    if not (settings.IMAGE_PREPROCESS_ENABLED and AVAILABLE):
+        return None
+    try:
+        load_deps()
+        raw = _read(source)
+        image = Image.open(io.BytesIO(raw))
+        max_edge = settings.IMAGE_MAX_EDGE
+        # JPEG: let the decoder downscale by 1/2..1/8 instead of decoding all 12 MP
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        out = io.BytesIO()
+        # No exif= argument: the re-encoded file carries no metadata (GPS, device)
+        image.save(out, format="JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        data = out.getvalue() if out.tell() < len(raw) else None
+        return PreprocessedImage(data=data, mime_type="image/jpeg" if data is not None else None,
+                                 phash=dhash(image), thumbnail=thumbnail(image), original_bytes=len(raw),
+                                 size=image.size)
+    except Exception as e:
+        print(f"Image pre-processing skipped: {e}")
+        return None
+
+
+def report(result: PreprocessedImage):
+    if result.data is None:
+        print(f"Image pre-processing: re-encode not smaller, keeping the original {result.original_bytes} bytes")
+        return
+    bytes_saved_total.inc(result.bytes_saved)
+    print(f"Image pre-processing: {result.original_bytes} -> {len(result.data)} bytes, "
+          f"{result.size[0]}x{result.size[1]}")
+
+
+class PerceptualIndex:
+    """
+    Recent image results keyed by perceptual hash. A new image within
+    `max_distance` bits of a stored one, whose 32x32 thumbnail also differs by
+    at most `max_pixel_diff` on average, gets that result instead of a model
+    call. The 64-bit hash alone can't tell two receipts from the same shop
+    apart; the thumbnail check can.
+    Entries expire after `ttl_seconds` like the result cache's time buckets,
+    so relative dates in the answer don't go stale.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None, max_distance: int = None,
+                 max_pixel_diff: float = None):
+        self.max_entries = settings.IMAGE_DEDUPE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = settings.IMAGE_DEDUPE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_distance = settings.IMAGE_DEDUPE_MAX_DISTANCE if max_distance is None else max_distance
+        self.max_pixel_diff = settings.IMAGE_DEDUPE_MAX_PIXEL_DIFF if max_pixel_diff is None else max_pixel_diff
+        self._entries = OrderedDict()  # phash -> (stored_at, thumbnail, BrainDumpResponse)
+        self.hits = 0
+
+    def find(self, phash: int, thumb: bytes) -> Optional[BrainDumpResponse]:
+        if self.max_distance < 0:
+            return None
+        now = time.monotonic()
+        while self._entries:
+            stored_at = next(iter(self._entries.values()))[0]
+            if now - stored_at < self.ttl:
+                break
+            self._entries.popitem(last=False)
+        best = None
+        for known, (_, known_thumb, result) in self._entries.items():
+            if bin(known ^ phash).count("1") > self.max_distance:
+                continue
+            diff = pixel_difference(known_thumb, thumb)
+            if diff <= self.max_pixel_diff and (best is None or diff < best[0]):
+                best = (diff, result)
+        if best is None:
+            return None
+        self.hits += 1
+        dedupe_hits_total.inc()
+        return best[1]
+
+    def add(self, phash: int, thumb: bytes, result: BrainDumpResponse):
+        if self.max_distance < 0:
+            return
+        self._entries.pop(phash, None)
+        self._entries[phash] = (time.monotonic(), thumb, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import registry
+from app.models import sql_models
+from app.models.schemas import BrainDumpResponse, JobResponse, JobStatus
+from app.services.pipeline import process_and_store
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Bounded worker pool for audio/image dumps submitted with async_mode.
+    Job state lives in the `jobs` table, so a restart picks up every job that
+    was still queued or running (at-least-once: an interrupted job runs again).
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, storage_dir: str = None):
+        self.workers = settings.JOB_WORKERS if workers is None else workers
+        self.max_pending = settings.JOB_QUEUE_SIZE if max_pending is None else max_pending
+        self.storage_dir = settings.JOB_STORAGE_DIR if storage_dir is None else storage_dir
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._listeners = defaultdict(set)
+
+    async def start(self):
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        async with AsyncSessionLocal() as db:
+            pending = (await db.scalars(
+                select(sql_models.Job.id).where(
+                    sql_models.Job.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value])
+                ).order_by(sql_models.Job.created_at)
+            )).all()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending:
+            print(f"Recovered {len(pending)} unfinished job(s)")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def input_path(self, job_id: str, filename: Optional[str]) -> str:
+        # Inputs must outlive the request (and the process) until the job runs
+        ext = os.path.splitext(filename or "")[1][:10]
+        return os.path.join(self.storage_dir, f"{job_id}{ext}")
+
+    async def submit(self, job_id: str, kind: str, input_path: str, content_hash: str,
+                     mime_type: Optional[str] = None) -> JobResponse:
+        if self._queue is None:
+            raise JobQueueFull("Job workers are not running")
+        if self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull("Too many pending jobs, try again later")
+
+        async with AsyncSessionLocal() as db:
+            job = sql_models.Job(id=job_id, kind=kind, status=JobStatus.QUEUED.value,
+                                 input_path=input_path, content_hash=content_hash, mime_type=mime_type)
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+            response = to_job_response(job)
+        self._queue.put_nowait(job_id)
+        return response
+
+    async def get(self, job_id: str) -> Optional[JobResponse]:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(sql_models.Job, job_id)
+            return to_job_response(job) if job else None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        listener = asyncio.Queue()
+        self._listeners[job_id].add(listener)
+        return listener
+
+    def unsubscribe(self, job_id: str, listener: asyncio.Queue):
+        self._listeners[job_id].discard(listener)
+        if not self._listeners[job_id]:
+            del self._listeners[job_id]
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Job worker error ({job_id}): {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        from app.services.ai_service import ai_service
+
+        job = await self._update(job_id, status=JobStatus.RUNNING.value)
+        if job is None:
+            return
+        try:
+            if job.kind == "audio":
+                process = lambda: ai_service.process_audio(job.input_path, content_hash=job.content_hash,
+                                                           mime_type=job.mime_type)
+            elif job.kind == "image":
+                process = lambda: ai_service.process_image(job.input_path, content_hash=job.content_hash,
+                                                           mime_type=job.mime_type)
+            else:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            result = await process_and_store(job.kind, job.content_hash, process)
+            await self._update(job_id, status=JobStatus.DONE.value, result=result.model_dump_json())
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            await self._update(job_id, status=JobStatus.FAILED.value, error=str(e))
+        # Only once the job is finished: a cancelled one (shutdown) stays `running`
+        # and runs again after the restart, so it still needs its input
+        if job.input_path and os.path.exists(job.input_path):
+            os.remove(job.input_path)
+
+    async def _update(self, job_id: str, **fields) -> Optional[sql_models.Job]:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(sql_models.Job, job_id)
+            if job is None:
+                return None
+            for name, value in fields.items():
+                setattr(job, name, value)
+            await db.commit()
+            await db.refresh(job)
+            response = to_job_response(job)
+        for listener in self._listeners.get(job_id, ()):
+            listener.put_nowait(response)
+        # Detached row, the attributes loaded by refresh() stay readable
+        return job
+
+
+def to_job_response(job: sql_models.Job) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        result=BrainDumpResponse.model_validate_json(job.result) if job.result else None,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+job_queue = JobQueue()
+
+registry.register_collector(lambda: [
+    ("braindump_job_queue_depth", "gauge", "Async jobs waiting for a worker",
+     [({}, job_queue._queue.qsize() if job_queue._queue is not None else 0)]),
+])
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Optional, Union
+
+from app.core.config import settings
+
+
+class ModelError(Exception):
+    """Provider-style error carrying an HTTP-like status `code` (what ModelPolicy inspects)."""
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(message or f"Model error {code}")
+        self.code = code
+
+
+@dataclass
+class ModelResponse:
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class UploadedFile:
+    # Opaque handle returned by a backend upload; `ref` is what goes into `contents`
+    ref: object
+    name: str
+    mime_type: Optional[str] = None
+    size: int = 0
+    expires_at: Optional[float] = None  # epoch seconds, when the provider drops the file
+    extra: dict = field(default_factory=dict)
+
+
+class ModelBackend:
+    """
+    Async interface in front of the LLM provider.
+    Models are addressed by role ("flash" / "pro") so AIService never needs
+    to know the provider specific model names.
+    """
+    name = "base"
+
+    async def upload(self, file: Union[str, BinaryIO], mime_type: Optional[str] = None) -> UploadedFile:
+        """`file` is a path or a readable binary stream (then mime_type is required)."""
+        raise NotImplementedError
+
+    async def delete(self, file: UploadedFile):
+        raise NotImplementedError
+
+    async def generate(self, model: str, contents: list, json_mode: bool = False) -> ModelResponse:
+        raise NotImplementedError
+
+    async def stream(self, model: str, contents: list, json_mode: bool = False,
+                     result: Optional[ModelResponse] = None) -> AsyncIterator[str]:
+        """
+        Yields text chunks as the model produces them. When `result` is given it
+        receives the full text and token usage once the stream is exhausted.
+        """
+        raise NotImplementedError
+
+
+class GeminiBackend(ModelBackend):
+    name = "gemini"
+
+    def __init__(self):
+        import google.generativeai as genai
+
+        self._genai = genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        # Try to use a stable model name suitable for the API key tier
+        # Updated to use stable aliases which should have quota
+        self.models = {
+            "flash": genai.GenerativeModel(settings.GEMINI_FLASH_MODEL),
+            "pro": genai.GenerativeModel(settings.GEMINI_PRO_MODEL),
+        }
+
+    def _generation_config(self, json_mode: bool):
+        return {"response_mime_type": "application/json"} if json_mode else None
+
+    async def upload(self, file: Union[str, BinaryIO], mime_type: Optional[str] = None) -> UploadedFile:
+        # genai.upload_file is a blocking HTTP call, keep it off the event loop
+        uploaded = await asyncio.to_thread(self._genai.upload_file, file, mime_type=mime_type)
+        expiration = getattr(uploaded, "expiration_time", None)
+        return UploadedFile(
+            ref=uploaded,
+            name=uploaded.name,
+            mime_type=getattr(uploaded, "mime_type", mime_type),
+            size=getattr(uploaded, "size_bytes", 0) or 0,
+            expires_at=expiration.timestamp() if expiration is not None else None,
+        )
+
+    async def delete(self, file: UploadedFile):
+        await asyncio.to_thread(self._genai.delete_file, file.name)
+
+    async def generate(self, model: str, contents: list, json_mode: bool = False) -> ModelResponse:
+        response = await self.models[model].generate_content_async(
+            [self._to_part(c) for c in contents],
+            generation_config=self._generation_config(json_mode),
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return ModelResponse(
+            text=response.text,
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        )
+
+    async def stream(self, model: str, contents: list, json_mode: bool = False,
+                     result: Optional[ModelResponse] = None) -> AsyncIterator[str]:
+        response = await self.models[model].generate_content_async(
+            [self._to_part(c) for c in contents],
+            generation_config=self._generation_config(json_mode),
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.text:
+                if result is not None:
+                    result.text += chunk.text
+                yield chunk.text
+        if result is not None:
+            usage = getattr(response, "usage_metadata", None)
+            result.model = model
+            result.prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            result.output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+
+    def _to_part(self, content):
+        return content.ref if isinstance(content, UploadedFile) else content
+
+
+class StubBackend(ModelBackend):
+    """
+    Deterministic offline backend for load tests and local development.
+    The same input always produces the same output, no network involved.
+    Latency jitter, 5xx errors and 429s are injected from a seeded RNG so
+    load tests can exercise the retry/fallback paths reproducibly.
+    """
+    name = "stub"
+
+    def __init__(self, latency_ms: Optional[int] = None, jitter_ms: Optional[int] = None,
+                 error_rate: Optional[float] = None, rate_limit_rate: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.latency_ms = settings.STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.STUB_LATENCY_JITTER_MS if jitter_ms is None else jitter_ms
+        self.error_rate = settings.STUB_ERROR_RATE if error_rate is None else error_rate
+        self.rate_limit_rate = settings.STUB_RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate
+        self._rng = random.Random(settings.STUB_SEED if seed is None else seed)
+        self.uploads = 0
+        self.deletes = 0
+
+    async def upload(self, file: Union[str, BinaryIO], mime_type: Optional[str] = None) -> UploadedFile:
+        await self._sleep()
+        digest = hashlib.sha256()
+        size = 0
+        f = open(file, "rb") if isinstance(file, str) else file
+        try:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        finally:
+            if isinstance(file, str):
+                f.close()
+        self.uploads += 1
+        return UploadedFile(ref=f"stub-file:{digest.hexdigest()}", name=f"files/{digest.hexdigest()[:16]}",
+                            mime_type=mime_type, size=size, expires_at=time.time() + 48 * 3600)
+
+    async def delete(self, file: UploadedFile):
+        self.deletes += 1
+
+    async def generate(self, model: str, contents: list, json_mode: bool = False) -> ModelResponse:
+        await self._sleep()
+        self._maybe_fail()
+        text = self._render(contents, json_mode)
+        prompt_tokens = sum(len(str(self._to_text(c)).split()) for c in contents)
+        return ModelResponse(text=text, model=model, prompt_tokens=prompt_tokens,
+                             output_tokens=len(text.split()))
+
+    async def stream(self, model: str, contents: list, json_mode: bool = False,
+                     result: Optional[ModelResponse] = None) -> AsyncIterator[str]:
+        await self._sleep(fraction=0.3)  # time to first token
+        self._maybe_fail()
+        text = self._render(contents, json_mode)
+        step = 16
+        for i in range(0, len(text), step):
+            await self._sleep(fraction=0.1)
+            if result is not None:
+                result.text += text[i:i + step]
+            yield text[i:i + step]
+        if result is not None:
+            result.model = model
+            result.prompt_tokens = sum(len(str(self._to_text(c)).split()) for c in contents)
+            result.output_tokens = len(text.split())
+
+    async def _sleep(self, fraction: float = 1.0):
+        latency = self.latency_ms
+        if self.jitter_ms:
+            latency = max(0.0, latency + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+        if latency:
+            await asyncio.sleep(latency * fraction / 1000)
+
+    def _maybe_fail(self):
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            raise ModelError(429, "Stub: resource exhausted")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ModelError(503, "Stub: service unavailable")
+
+    def _to_text(self, content) -> str:
+        return content.ref if isinstance(content, UploadedFile) else str(content)
+
+    def _render(self, contents: list, json_mode: bool) -> str:
+        # The user input is always the last part, the system prompt comes first
+        user_input = self._to_text(contents[-1]) if contents else ""
+        if not json_mode:
+            return f"Stub cevap #{hashlib.sha256(user_input.encode('utf-8')).hexdigest()[:8]}"
+
+        # Batched prompt (AIService._process_text_batch): answer every "[ITEM n]" separately
+        items = re.split(r"^\[ITEM (\d+)\]\n", user_input, flags=re.MULTILINE)
+        if len(items) > 2:
+            results = []
+            for index, item in zip(items[1::2], items[2::2]):
+                results.append({"id": int(index), **json.loads(self._render_dump(item.strip()))})
+            return json.dumps({"results": results}, ensure_ascii=False)
+        return self._render_dump(user_input)
+
+    def _render_dump(self, user_input: str) -> str:
+        types = ["TODO", "NOTE", "SHOPPING_ITEM", "CALENDAR_EVENT", "REMINDER", "ALARM"]
+        sentences = [s.strip() for s in re.split(r"[.!?\n]+", user_input) if s.strip()] or [user_input or "empty"]
+        actions = []
+        for sentence in sentences:
+            h = int(hashlib.sha256(sentence.encode("utf-8")).hexdigest(), 16)
+            actions.append({
+                "type": types[h % len(types)],
+                "content": sentence[:200],
+                "category": "Stub",
+                "datetime_iso": None,
+                "priority": ["HIGH", "MEDIUM", "LOW"][h % 3],
+                "confidence": round(0.5 + (h % 50) / 100, 2),
+            })
+        return json.dumps({"summary": sentences[0][:80], "actions": actions}, ensure_ascii=False)
+
+
+def get_backend(name: Optional[str] = None) -> ModelBackend:
+    name = (name or settings.MODEL_BACKEND).lower()
+    if name == "stub":
+        return StubBackend()
+    if name == "gemini":
+        return GeminiBackend()
+    raise ValueError(f"Unknown model backend: {name}")
@@ -0,0 +1,340 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import record_tokens, timed
+from app.services.model_backend import ModelBackend
+
+# HTTP-ish status codes worth retrying. google.api_core exceptions expose them as `.code`
+RATE_LIMIT_CODES = {429}
+TRANSIENT_CODES = {429, 500, 502, 503, 504}
+
+
+def error_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    value = getattr(code, "value", None)  # grpc StatusCode / HTTPStatus
+    return value if isinstance(value, int) else None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return error_code(error) in RATE_LIMIT_CODES
+
+
+def is_transient(error: Exception) -> bool:
+    return error_code(error) in TRANSIENT_CODES or isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """Client-side request quota: `rate_per_minute` requests, bursts up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)  # ~10s worth of burst
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        # The server says we are over quota: stop bursting until the bucket refills
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive transient failures.
+    While open, calls skip the model entirely; after `reset_seconds` a single
+    probe is let through (half-open) and its outcome closes or re-opens it.
+    A probe cancelled before it has an outcome must be released, or no other
+    call is ever let through again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        # No outcome (cancelled): the next call may probe instead
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds) for one model."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        if len(self.samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelPolicy:
+    """
+    Shared retry/fallback policy for every AIService call: per-model token
+    buckets, exponential backoff with full jitter, a circuit breaker that
+    sends traffic straight to the fallback while the primary is unhealthy and
+    a per-endpoint retry budget.
+
+    Every call has a per-model deadline. With hedging on, a primary call still
+    running after its rolling p95 gets a parallel fallback call; the first
+    valid result wins and the other call is cancelled.
+    """
+
+    def __init__(self, primary: str = "flash", fallback: str = "pro"):
+        self.primary = primary
+        self.fallback = fallback
+        self.buckets: Dict[str, TokenBucket] = {
+            "flash": TokenBucket(settings.MODEL_FLASH_RPM),
+            "pro": TokenBucket(settings.MODEL_PRO_RPM),
+        }
+        self.breaker = CircuitBreaker(settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+        self.retry_budgets = dict(settings.MODEL_RETRY_BUDGETS)
+        self.timeouts = dict(settings.MODEL_TIMEOUT_SECONDS)
+        self.latency: Dict[str, LatencyTracker] = {"flash": LatencyTracker(), "pro": LatencyTracker()}
+        self.retries = 0
+        self.fallbacks = 0
+        self.short_circuited = 0
+        self.timeouts_hit = {"flash": 0, "pro": 0}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    def budget(self, endpoint: str) -> int:
+        return max(1, self.retry_budgets.get(endpoint, self.retry_budgets.get("default", 3)))
+
+    def backoff(self, attempt: int) -> float:
+        cap = min(settings.RETRY_BACKOFF_MAX_SECONDS, settings.RETRY_BACKOFF_BASE_SECONDS * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def pick_model(self) -> str:
+        """For single-shot calls (streaming): primary unless its breaker is open."""
+        if self.breaker.allow():
+            return self.primary
+        self.short_circuited += 1
+        return self.fallback
+
+    def record(self, model: str, error: Exception = None):
+        if model != self.primary:
+            return
+        if error is None or not is_transient(error):
+            # A non-transient error (bad request, blocked prompt) still means the model is up
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+            if is_rate_limit(error):
+                self.buckets[model].drain()
+
+    def release(self, model: str):
+        """
+        For calls that end without an outcome (cancelled, client gone). Harmless
+        when the call wasn't the half-open probe: at worst one extra probe goes through.
+        """
+        if model == self.primary:
+            self.breaker.release_probe()
+
+    async def acquire(self, model: str):
+        bucket = self.buckets.get(model)
+        if bucket is not None:
+            await bucket.acquire()
+
+    def hedge_delay(self) -> Optional[float]:
+        if not settings.HEDGE_ENABLED:
+            return None
+        delay = self.latency[self.primary].quantile(settings.HEDGE_QUANTILE, settings.HEDGE_MIN_SAMPLES)
+        return None if delay is None else max(delay, settings.HEDGE_MIN_DELAY_SECONDS)
+
+    async def _call(self, backend: ModelBackend, model: str, contents: list, json_mode: bool,
+                    parse: Optional[Callable]):
+        started = time.perf_counter()
+        try:
+            with timed("model_generate", model=model):
+                response = await asyncio.wait_for(
+                    backend.generate(model, contents, json_mode=json_mode), timeout=self.timeouts.get(model)
+                )
+            record_tokens(response)
+            if parse:
+                with timed("parse"):
+                    result = parse(response)
+            else:
+                result = response
+        except asyncio.TimeoutError:
+            self.timeouts_hit[model] = self.timeouts_hit.get(model, 0) + 1
+            error = asyncio.TimeoutError(f"{model} did not answer within {self.timeouts.get(model)}s")
+            self.record(model, error)
+            raise error
+        except asyncio.CancelledError:
+            # Lost a hedge race or the caller went away, says nothing about the model's health
+            self.release(model)
+            raise
+        except Exception as e:
+            self.record(model, e)
+            raise
+        self.latency.setdefault(model, LatencyTracker()).observe(time.perf_counter() - started)
+        self.record(model, None)
+        return result
+
+    async def stream_with_deadline(self, model: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        The per-model deadline for streaming calls, applied to the first chunk and
+        to every gap between chunks: a stalled stream raises asyncio.TimeoutError.
+        """
+        timeout = self.timeouts.get(model)
+        chunks = stream.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.timeouts_hit[model] = self.timeouts_hit.get(model, 0) + 1
+                    raise asyncio.TimeoutError(f"{model} stream stalled for {timeout}s")
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _primary_call(self, backend: ModelBackend, contents: list, json_mode: bool,
+                            parse: Optional[Callable]):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._call(backend, self.primary, contents, json_mode, parse)
+
+        primary = asyncio.create_task(self._call(backend, self.primary, contents, json_mode, parse))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            # Primary is slower than its p95: race it against the fallback
+            self.hedges += 1
+            await self.acquire(self.fallback)
+            hedge = asyncio.create_task(self._call(backend, self.fallback, contents, json_mode, parse))
+            tasks.append(hedge)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        else:
+                            self.primary_wins += 1
+                        return task.result()
+            # Both failed: report the primary's error so retry/fallback logic applies
+            return primary.result()
+        finally:
+            # Cancel the loser (or everything, if our caller went away)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def generate(self, backend: ModelBackend, endpoint: str, contents: list,
+                       json_mode: bool = False, parse: Optional[Callable] = None):
+        """
+        Returns the ModelResponse, or parse(response) when `parse` is given.
+        A response that fails to parse counts as a failed attempt.
+        """
+        attempts = self.budget(endpoint)
+        last_error = None
+
+        if not self.breaker.allow():
+            self.short_circuited += 1
+        else:
+            for attempt in range(attempts):
+                try:
+                    await self.acquire(self.primary)
+                    return await self._primary_call(backend, contents, json_mode, parse)
+                except asyncio.CancelledError:
+                    # Also while waiting for a token, before _call could release it
+                    self.release(self.primary)
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if not is_transient(e):
+                        print(f"Primary model error: {e}, switching to fallback immediately.")
+                        break
+                    if attempt == attempts - 1 or self.breaker.state != "closed":
+                        break
+                    delay = self.backoff(attempt)
+                    self.retries += 1
+                    print(f"{endpoint}: transient error ({e}), retrying in {delay:.2f}s "
+                          f"(Attempt {attempt+1}/{attempts})")
+                    await asyncio.sleep(delay)
+
+        self.fallbacks += 1
+        if last_error is not None:
+            print(f"{endpoint}: primary model exhausted, trying fallback...")
+        await self.acquire(self.fallback)
+        return await self._call(backend, self.fallback, contents, json_mode, parse)
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "short_circuited": self.short_circuited,
+            "timeouts": dict(self.timeouts_hit),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "p95_seconds": {m: t.quantile(0.95) for m, t in self.latency.items()},
+        }
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from fastapi.responses import StreamingResponse
+
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import registry, timed
+from app.crud import action_crud
+from app.models.schemas import ActionResponse, BrainDumpResponse, ProcessedAction
+from app.services.briefing_service import briefing_service
+from app.services.reminder_scheduler import reminder_scheduler
+from app.services.single_flight import SingleFlight
+
+single_flight = SingleFlight()
+
+# create_action(s) run through run_sync: greenlets on the event loop thread, where the
+# near-duplicate index's threading lock lets every one of them in. One store at a time,
+# so a lookup and the insert after it can't interleave with another dump's
+store_lock = asyncio.Lock()
+
+registry.register_collector(lambda: [
+    ("braindump_single_flight_coalesced_total", "counter", "Duplicate submissions that joined an in-flight call",
+     [({}, single_flight.coalesced)]),
+    ("braindump_single_flight_inflight", "gauge", "Distinct inputs being processed right now",
+     [({}, len(single_flight))]),
+])
+
+
+def stored(ids: List[int], actions: List[ProcessedAction]):
+    """Hands freshly stored actions to the background services that care about them."""
+    pairs = list(zip(ids, actions))
+    reminder_scheduler.schedule(i for i, a in pairs if a.type in action_crud.REMINDER_TYPES)
+    briefing_service.invalidate(i for i, a in pairs if a.type in action_crud.BRIEFING_TYPES)
+
+
+async def process_and_store(kind: str, content_hash: str, process: Callable[[], Awaitable[BrainDumpResponse]],
+                            cleanup: Callable[[], None] = None) -> BrainDumpResponse:
+    """
+    Runs an AIService call and saves its actions, once per input fingerprint.
+    Duplicate submissions arriving while the first one is in flight share
+    its model call and its DB write and receive the same BrainDumpResponse.
+    `cleanup` (closing the upload `process` reads) is handed to the flight:
+    the shared call may outlive the request that started it.
+    """
+    async def run():
+        result = await process()
+        # Own session: the request that started the flight may go away before we finish
+        with timed("store"):
+            async with store_lock, AsyncSessionLocal() as db:
+                ids = await db.run_sync(action_crud.create_actions, result)
+        stored(ids, result.actions)
+        return result
+
+    return await single_flight.do(f"{kind}:{content_hash}", run, cleanup=cleanup)
+
+
+def stream_and_store(make_stream: Callable[[BrainDumpResponse], AsyncIterator],
+                     cleanup: Callable[[], None] = None) -> StreamingResponse:
+    """
+    NDJSON response for the streaming process endpoints. Every action is saved
+    and written out as one ActionResponse line the moment the model finishes it;
+    the last line carries the summary and timings ({"summary": ..., "count": ...})
+    or {"error": ...} if the model failed midway.
+    """
+    async def lines():
+        started = time.perf_counter()
+        first_action_ms = None
+        result = BrainDumpResponse(summary="", actions=[])
+        actions = make_stream(result)
+        db = AsyncSessionLocal()
+        try:
+            async for action in actions:
+                with timed("store"):
+                    async with store_lock:
+                        db_action = await db.run_sync(action_crud.create_action, action)
+                stored([db_action.id], [action])
+                if first_action_ms is None:
+                    first_action_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield ActionResponse.model_validate(db_action).model_dump_json() + "\n"
+            yield json.dumps({
+                "summary": result.summary,
+                "count": len(result.actions),
+                "first_action_ms": first_action_ms,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"Streaming dump failed: {e}")
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+        finally:
+            await actions.aclose()
+            await db.close()
+            if cleanup:
+                cleanup()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,260 @@
+import asyncio
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, bindparam, select, text, tuple_, update
+
+from app.core.config import settings
+from app.core.database import IS_SQLITE, AsyncSessionLocal
+from app.core.metrics import registry
+from app.models.sql_models import Action, PENDING_REMINDER
+from app.services.background_loop import BackgroundLoop
+
+reminders_total = registry.counter(
+    "braindump_reminders_total", "Reminders handled by the scheduler, by outcome (fired, missed, failed)")
+
+MAX_ID = 2 ** 63 - 1
+
+# Without ANALYZE stats SQLite prefers ix_actions_type for the IN and then sorts every
+# reminder ever stored, so name the partial index explicitly (SQLAlchemy drops SQLite hints).
+# Postgres has no INDEXED BY and picks the partial index on its own
+_WINDOW_SQL = """
+    SELECT datetime_iso, id FROM actions {hint}
+    WHERE {pending} AND datetime_iso <= :until {after}
+    ORDER BY datetime_iso, id LIMIT :limit
+"""
+
+
+def _window_query(after: bool):
+    sql = _WINDOW_SQL.format(hint="INDEXED BY ix_actions_pending_reminders" if IS_SQLITE else "",
+                             pending=PENDING_REMINDER.text,
+                             after="AND (datetime_iso, id) > (:after_due, :after_id)" if after else "")
+    params = [bindparam("until", type_=DateTime)]
+    if after:
+        params += [bindparam("after_due", type_=DateTime), bindparam("after_id", type_=Integer)]
+    return text(sql).bindparams(*params).columns(datetime_iso=DateTime, id=Integer)
+
+
+@dataclass
+class Reminder:
+    id: int
+    type: str
+    content: str
+    category: Optional[str]
+    priority: Optional[str]
+    due_at: datetime  # UTC
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "content": self.content,
+            "category": self.category,
+            "priority": self.priority,
+            "due_at": self.due_at.isoformat() + "Z",
+        }
+
+
+class Notifier:
+    """Delivers a fired reminder. Raising makes the scheduler retry it later."""
+
+    async def notify(self, reminder: Reminder):
+        raise NotImplementedError
+
+
+class LogNotifier(Notifier):
+    async def notify(self, reminder: Reminder):
+        print(f"Reminder {reminder.id} ({reminder.type}, due {reminder.due_at.isoformat()}Z): {reminder.content}")
+
+
+class WebhookNotifier(Notifier):
+    """POSTs the reminder as JSON; any non-2xx answer counts as a failure."""
+
+    def __init__(self, url: str, timeout: float = None):
+        self.url = url
+        self.timeout = settings.REMINDER_WEBHOOK_TIMEOUT_SECONDS if timeout is None else timeout
+
+    async def notify(self, reminder: Reminder):
+        import requests
+
+        response = await asyncio.to_thread(requests.post, self.url, json=reminder.to_dict(), timeout=self.timeout)
+        response.raise_for_status()
+
+
+def get_notifier(name: Optional[str] = None) -> Notifier:
+    name = (name or settings.REMINDER_NOTIFIER).lower()
+    if name == "log":
+        return LogNotifier()
+    if name == "webhook":
+        if not settings.REMINDER_WEBHOOK_URL:
+            raise ValueError("REMINDER_WEBHOOK_URL is required for the webhook notifier")
+        return WebhookNotifier(settings.REMINDER_WEBHOOK_URL)
+    raise ValueError(f"Unknown reminder notifier: {name}")
+
+
+class ReminderScheduler(BackgroundLoop):
+    """
+    Fires ALARM/REMINDER actions at their datetime_iso.
+
+    Only the next REMINDER_WINDOW_SECONDS are kept in memory, in a heap of
+    (due, id). The following window is read from the partial index over
+    pending reminders when the current one runs low, at most
+    REMINDER_LOAD_BATCH rows at a time, so the number of reminders waiting
+    in the table doesn't matter. Writers pass new action ids to schedule()
+    so reminders due inside the loaded window are picked up right away.
+
+    Every reminder is claimed with a conditional UPDATE of fired_at before
+    the notifier runs: a restart, or a second process sharing the database,
+    never fires it twice (at most once; a crash right after the claim loses
+    that notification). When the notifier raises, the claim is released and
+    the reminder retried after REMINDER_WINDOW_SECONDS / 10.
+    """
+
+    name = "Reminder scheduler"
+
+    def __init__(self, notifier: Notifier = None, window_seconds: int = None, batch_size: int = None,
+                 grace_seconds: int = None):
+        super().__init__()
+        self._notifier = notifier
+        self.window = timedelta(seconds=settings.REMINDER_WINDOW_SECONDS if window_seconds is None else window_seconds)
+        self.batch_size = settings.REMINDER_LOAD_BATCH if batch_size is None else batch_size
+        self.grace = timedelta(
+            seconds=settings.REMINDER_MISFIRE_GRACE_SECONDS if grace_seconds is None else grace_seconds)
+        self._heap: List[Tuple[datetime, int]] = []
+        self._queued = set()
+        # Every pending reminder with (datetime_iso, id) <= this key is in the heap
+        self._horizon: Optional[Tuple[datetime, int]] = None
+
+    @property
+    def notifier(self) -> Notifier:
+        if self._notifier is None:
+            self._notifier = get_notifier()
+        return self._notifier
+
+    def start(self):
+        if not self.running:
+            self.notifier  # fail at startup on a misconfigured notifier
+        super().start()
+
+    async def stop(self):
+        await super().stop()
+        self._heap, self._queued, self._horizon = [], set(), None
+
+    def schedule(self, action_ids: Iterable[int]):
+        """Called after actions are stored; non-reminders and far-off ones are ignored by the loop."""
+        self._notify(action_ids)
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def _step(self, now: datetime) -> float:
+        """One pass: pick up new ids, load the next window if needed, fire what's due. Returns seconds to sleep."""
+        ids = self._take_ids()
+        if ids:
+            await self._load_ids(ids)
+        if len(self._heap) < self.batch_size and self._needs_extend(now):
+            await self._extend(now)
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, action_id = heapq.heappop(self._heap)
+            self._queued.discard(action_id)
+            due.append(action_id)
+        for start in range(0, len(due), self.batch_size):
+            await self._fire(due[start:start + self.batch_size], now)
+
+        waits = [self.window.total_seconds() / 2]
+        if self._heap:
+            waits.append((self._heap[0][0] - now).total_seconds())
+        if len(self._heap) < self.batch_size and self._horizon is not None:
+            waits.append((self._horizon[0] - self.window / 2 - now).total_seconds())
+        return max(0.0, min(waits))
+
+    def _needs_extend(self, now: datetime) -> bool:
+        return self._horizon is None or self._horizon[0] < now + self.window / 2
+
+    def _push(self, due: datetime, action_id: int):
+        if action_id not in self._queued:
+            self._queued.add(action_id)
+            heapq.heappush(self._heap, (due, action_id))
+
+    async def _extend(self, now: datetime):
+        until = now + self.window
+        params = {"until": until, "limit": self.batch_size}
+        if self._horizon is not None:
+            params.update(after_due=self._horizon[0], after_id=self._horizon[1])
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(_window_query(self._horizon is not None), params)).all()
+        for due, action_id in rows:
+            self._push(due, action_id)
+        # A full batch may have stopped short of `until`, continue from the last row next time
+        self._horizon = tuple(rows[-1]) if len(rows) >= self.batch_size else (until, MAX_ID)
+
+    async def _load_ids(self, ids: List[int]):
+        if self._horizon is None:
+            return  # the first window load sees them anyway
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Action.datetime_iso, Action.id).where(
+                    Action.id.in_(ids), PENDING_REMINDER,
+                    tuple_(Action.datetime_iso, Action.id) <= self._horizon,
+                )
+            )).all()
+        for due, action_id in rows:
+            self._push(due, action_id)
+
+    async def _fire(self, ids: List[int], now: datetime):
+        # The claim: only rows still pending and still due (the action may have been deleted)
+        claim = (
+            update(Action)
+            .where(Action.id.in_(ids), PENDING_REMINDER, Action.datetime_iso <= now)
+            .values(fired_at=now)
+            .returning(Action.id, Action.type, Action.content, Action.category, Action.priority,
+                       Action.datetime_iso)
+            .execution_options(synchronize_session=False)
+        )
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(claim)).all()
+            await db.commit()
+
+        reminders = [Reminder(*row) for row in rows]
+        missed = [r for r in reminders if now - r.due_at > self.grace]
+        if missed:
+            reminders_total.inc(len(missed), outcome="missed")
+            print(f"Skipped {len(missed)} reminder(s) more than {self.grace} overdue")
+        live = [r for r in reminders if now - r.due_at <= self.grace]
+        results = await asyncio.gather(*[self.notifier.notify(r) for r in live], return_exceptions=True)
+
+        failed = []
+        for reminder, result in zip(live, results):
+            if isinstance(result, Exception):
+                print(f"Reminder {reminder.id} notification failed: {result}")
+                failed.append(reminder)
+        if len(live) > len(failed):
+            reminders_total.inc(len(live) - len(failed), outcome="fired")
+        if failed:
+            reminders_total.inc(len(failed), outcome="failed")
+            await self._release(failed, now)
+
+    async def _release(self, reminders: List[Reminder], claimed_at: datetime):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Action)
+                .where(Action.id.in_([r.id for r in reminders]), Action.fired_at == claimed_at)
+                .values(fired_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        retry_at = claimed_at + self.window / 10
+        for reminder in reminders:
+            self._push(retry_at, reminder.id)
+
+
+reminder_scheduler = ReminderScheduler()
+
+registry.register_collector(lambda: [
+    ("braindump_reminders_pending", "gauge", "Reminders loaded into the scheduler's current window",
+     [({}, reminder_scheduler.pending())]),
+])
@@ -0,0 +1,211 @@
+import json
+from typing import Optional, Union
+
+from pydantic import ValidationError
+
+from app.core.metrics import registry
+from app.models.schemas import BrainDumpResponse, ProcessedAction
+
+# Counters for /metrics: how often the fast path was enough, how often we repaired
+stats = {"fast": 0, "repaired": 0, "failed": 0, "dropped_actions": 0}
+
+registry.register_collector(lambda: [
+    ("braindump_parse_total", "counter", "Model outputs parsed, by path",
+     [({"path": path}, stats[path]) for path in ("fast", "repaired", "failed")]),
+    ("braindump_parse_dropped_actions_total", "counter", "Invalid actions dropped while parsing",
+     [({}, stats["dropped_actions"])]),
+])
+
+
+def strip_fences(text: str) -> str:
+    # Handle potential markdown code blocks
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def _drop_trailing_comma(out: list):
+    while out and out[-1] in " \t\r\n":
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """
+    Single scan over LLM output that fixes the usual defects:
+    text around the object, trailing commas, mismatched closers and truncation
+    (cut back to the last complete element, then close the open containers).
+    """
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in model output")
+
+    out = []
+    stack = []
+    in_string = escape = False
+    safe_len, safe_stack = 0, []
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                break  # root object closed, ignore whatever follows
+            safe_len, safe_stack = len(out), list(stack)
+            continue
+        out.append(ch)
+
+    if stack:
+        if not safe_len:
+            raise ValueError("Model output truncated before any complete element")
+        out, stack = out[:safe_len], safe_stack
+        _drop_trailing_comma(out)
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def parse_brain_dump(raw: Union[str, bytes]) -> BrainDumpResponse:
+    """
+    Fast path: pydantic validates straight from the JSON text in one pass.
+    Otherwise repair the JSON and validate action by action, dropping the
+    invalid ones instead of failing the whole dump.
+    """
+    try:
+        result = BrainDumpResponse.model_validate_json(raw)
+        stats["fast"] += 1
+        return result
+    except ValidationError:
+        pass
+
+    text = raw.decode("utf-8", "replace") if isinstance(raw, bytes) else raw
+    try:
+        data = json.loads(repair_json(strip_fences(text)))
+    except ValueError:
+        stats["failed"] += 1
+        raise
+    if not isinstance(data, dict):
+        stats["failed"] += 1
+        raise ValueError("Model output is not a JSON object")
+
+    result = parse_brain_dump_obj(data)
+    stats["repaired"] += 1
+    return result
+
+
+def parse_action(raw_action) -> Optional[ProcessedAction]:
+    try:
+        return ProcessedAction.model_validate(raw_action)
+    except ValidationError as e:
+        stats["dropped_actions"] += 1
+        print(f"Dropping invalid action {raw_action!r}: {e.errors()[0].get('msg')}")
+        return None
+
+
+def parse_brain_dump_obj(data: dict) -> BrainDumpResponse:
+    """Lenient validation of an already decoded dump; bad actions are dropped."""
+    raw_actions = data.get("actions")
+    actions = [parse_action(a) for a in (raw_actions if isinstance(raw_actions, list) else [])]
+    summary = data.get("summary")
+    return BrainDumpResponse(summary=summary if isinstance(summary, str) else "",
+                             actions=[a for a in actions if a is not None])
+
+
+class IncrementalDumpParser:
+    """
+    Push parser for a streamed BrainDump JSON document. feed() returns every
+    object of the top-level "actions" array whose closing brace has arrived,
+    so callers can act on each action before the model has finished.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.summary: Optional[str] = None
+        self.found_actions = False
+        self._pos = 0
+        self._stack = []  # open containers: "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key = None
+        self._actions_depth = None  # stack depth inside the "actions" array
+        self._object_start = None
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            depth = len(self._stack)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(text, i, depth)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                if (ch == "[" and depth == 1 and self._key == "actions" and not self._expect_key
+                        and self._actions_depth is None):
+                    self._actions_depth = depth + 1
+                    self.found_actions = True
+                elif ch == "{" and self._actions_depth is not None and depth == self._actions_depth:
+                    self._object_start = i
+                self._stack.append(ch)
+                self._expect_key = ch == "{"
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if (ch == "}" and self._object_start is not None
+                        and len(self._stack) == self._actions_depth):
+                    try:
+                        completed.append(json.loads(repair_json(text[self._object_start:i + 1])))
+                    except ValueError as e:
+                        print(f"Skipping unreadable streamed action: {e}")
+                    self._object_start = None
+                elif ch == "]" and self._actions_depth is not None and len(self._stack) < self._actions_depth:
+                    self._actions_depth = None
+            elif ch == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+            elif ch == ":":
+                self._expect_key = False
+        self._pos = len(text)
+        return completed
+
+    def _end_string(self, text: str, end: int, depth: int):
+        if depth != 1:
+            return
+        try:
+            value = json.loads(text[self._string_start:end + 1])
+        except ValueError:
+            return
+        if self._expect_key:
+            self._key = value
+        elif self._key == "summary":
+            self.summary = value
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.schemas import BrainDumpResponse
+
+
+class ResultCache:
+    """
+    Content-addressed cache for BrainDumpResponse results.
+
+    Keys are derived from the raw input bytes, the prompt template version and
+    a time bucket (the system prompt embeds the current time, so a cached
+    answer is only valid while relative dates like "yarın" still resolve the same).
+    Lookups hit an in-memory LRU first and fall back to an optional SQLite tier.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None,
+                 bucket_seconds: int = None, sqlite_path: str = None):
+        self.max_entries = settings.RESULT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_seconds = settings.RESULT_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.bucket_seconds = settings.RESULT_CACHE_BUCKET_SECONDS if bucket_seconds is None else bucket_seconds
+        self.sqlite_path = settings.RESULT_CACHE_SQLITE_PATH if sqlite_path is None else sqlite_path
+
+        self._entries = OrderedDict()  # key -> (expires_at, json)
+        # LRU lock: short in-memory work only, taken on the event loop
+        self._lock = threading.Lock()
+        # The shared connection, used from worker threads; never held together with _lock
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+
+        if self.sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def make_key(self, kind: str, prompt_version: str, digest: str, now: float = None) -> str:
+        """`digest` is the sha256 hex digest of the input bytes."""
+        now = time.time() if now is None else now
+        bucket = int(now // self.bucket_seconds) if self.bucket_seconds else 0
+        return hashlib.sha256(f"{kind}|{prompt_version}|{bucket}|{digest}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[BrainDumpResponse]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return BrainDumpResponse.model_validate_json(entry[1])
+                del self._entries[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._sqlite_get, key, now)
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self.sqlite_hits += 1
+                return BrainDumpResponse.model_validate_json(row[1])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: BrainDumpResponse):
+        expires_at = time.time() + self.ttl_seconds
+        payload = value.model_dump_json()
+        self._remember(key, expires_at, payload)
+        if self._db is not None:
+            await asyncio.to_thread(self._sqlite_set, key, expires_at, payload)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.sqlite_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "sqlite_hits": self.sqlite_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.sqlite_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM result_cache")
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, payload: str):
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _sqlite_get(self, key: str, now: float):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT expires_at, value FROM result_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+
+    def _sqlite_set(self, key: str, expires_at: float, payload: str):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at),
+            )
+            # Opportunistic purge so the file doesn't grow forever
+            self._db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file) -> str:
+    """sha256 of a file path or a seekable binary stream (rewound afterwards)."""
+    digest = hashlib.sha256()
+    if not isinstance(file, str):
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+        file.seek(0)
+        return digest.hexdigest()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+result_cache = ResultCache() if settings.RESULT_CACHE_ENABLED else None
+
+
+def _collect_metrics():
+    if result_cache is None:
+        return []
+    stats = result_cache.stats()
+    return [
+        ("braindump_result_cache_lookups_total", "counter", "Result cache lookups by outcome", [
+            ({"result": "hit"}, stats["hits"]),
+            ({"result": "sqlite_hit"}, stats["sqlite_hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ]),
+        ("braindump_result_cache_hit_ratio", "gauge", "Share of lookups served from the cache",
+         [({}, stats["hit_ratio"])]),
+        ("braindump_result_cache_entries", "gauge", "Entries in the in-memory tier", [({}, stats["entries"])]),
+    ]
+
+
+registry.register_collector(_collect_metrics)
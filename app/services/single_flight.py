@@ -0,0 +1,44 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+    The first caller starts the work, everyone arriving while it is still
+    running awaits the same task and gets the same result (or exception).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable], cleanup: Optional[Callable[[], None]] = None):
+        """
+        `cleanup` releases whatever `func` reads (an upload): it runs when the
+        shared task is done if this call started it, even after this caller was
+        cancelled, and right away if the call joined a running one instead.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            if cleanup is not None:
+                task.add_done_callback(lambda t: cleanup())
+        else:
+            self.coalesced += 1
+            if cleanup is not None:
+                cleanup()
+        # shield: a disconnecting client must not cancel work other callers wait on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter is gone
+            task.exception()
+
+    def __len__(self):
+        return len(self._inflight)
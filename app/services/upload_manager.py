@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.model_backend import ModelBackend, UploadedFile
+
+
+@dataclass
+class RemoteFile:
+    file: UploadedFile
+    uploaded_at: float
+    last_used: float
+
+
+class UploadManager:
+    """
+    Remote files keyed by content (kind + content hash + pre-processing variant).
+
+    The same content is uploaded once and reused while it is valid: used
+    within the last REMOTE_FILE_IDLE_SECONDS and not close to the provider's
+    own expiry. Concurrent requests for the same key share one upload;
+    different keys upload in parallel, up to UPLOAD_CONCURRENCY at a time.
+    A background sweeper deletes idle files, and everything still tracked is
+    deleted on shutdown, so nothing piles up in the provider's file storage.
+    """
+
+    def __init__(self, backend: Callable[[], ModelBackend], idle_seconds: float = None,
+                 max_files: int = None, concurrency: int = None):
+        self._backend = backend
+        self.idle_seconds = settings.REMOTE_FILE_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self.max_files = settings.REMOTE_FILE_MAX_FILES if max_files is None else max_files
+        self._semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY if concurrency is None else concurrency)
+        self._files: "OrderedDict[str, RemoteFile]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.uploads = 0
+        self.reused = 0
+        self.deleted = 0
+        self.delete_failures = 0
+
+    def _valid(self, entry: RemoteFile, now: float) -> bool:
+        if now - entry.last_used > self.idle_seconds:
+            return False
+        expires_at = entry.file.expires_at
+        # Leave room for retries and fallbacks that still reference the file
+        return expires_at is None or expires_at - time.time() > settings.REMOTE_FILE_EXPIRY_MARGIN_SECONDS
+
+    async def get_or_upload(self, key: str, upload: Callable[[], Awaitable[UploadedFile]]) -> UploadedFile:
+        now = time.monotonic()
+        entry = self._files.get(key)
+        if entry is not None:
+            if self._valid(entry, now):
+                entry.last_used = now
+                self._files.move_to_end(key)
+                self.reused += 1
+                return entry.file
+            self._forget(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._upload(key, upload))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._upload_done(k, t))
+        else:
+            self.reused += 1
+        # shield: one caller going away must not cancel an upload others wait on
+        return await asyncio.shield(task)
+
+    def _upload_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every waiter went away
+
+    async def _upload(self, key: str, upload: Callable[[], Awaitable[UploadedFile]]) -> UploadedFile:
+        async with self._semaphore:
+            uploaded = await upload()
+        self.uploads += 1
+        now = time.monotonic()
+        self._files[key] = RemoteFile(file=uploaded, uploaded_at=now, last_used=now)
+        while len(self._files) > self.max_files:
+            oldest, _ = next(iter(self._files.items()))
+            self._forget(oldest)
+        return uploaded
+
+    def _forget(self, key: str):
+        entry = self._files.pop(key, None)
+        if entry is not None:
+            self._delete_later(entry.file)
+
+    def _delete_later(self, file: UploadedFile):
+        task = asyncio.create_task(self._delete(file))
+        task.add_done_callback(lambda t: None if t.cancelled() else t.exception())
+
+    async def _delete(self, file: UploadedFile):
+        try:
+            await self._backend().delete(file)
+            self.deleted += 1
+        except Exception as e:
+            # The provider expires files on its own eventually, just note it
+            self.delete_failures += 1
+            print(f"Could not delete remote file {file.name}: {e}")
+
+    def sweep(self):
+        """Drops every idle or nearly expired file (deletes run in the background)."""
+        now = time.monotonic()
+        expired = [key for key, entry in self._files.items() if not self._valid(entry, now)]
+        for key in expired:
+            self._forget(key)
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(settings.REMOTE_FILE_SWEEP_SECONDS)
+            try:
+                swept = self.sweep()
+                if swept:
+                    print(f"Upload sweeper: deleting {swept} idle remote file(s)")
+            except Exception as e:
+                print(f"Upload sweeper error: {e}")
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self, timeout: float = 10.0):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        files = [entry.file for entry in self._files.values()]
+        self._files.clear()
+        if files:
+            try:
+                await asyncio.wait_for(asyncio.gather(*[self._delete(f) for f in files]), timeout)
+            except asyncio.TimeoutError:
+                print(f"Shutdown: gave up deleting {len(files)} remote file(s) after {timeout}s")
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._files),
+            "uploads": self.uploads,
+            "reused": self.reused,
+            "deleted": self.deleted,
+            "delete_failures": self.delete_failures,
+        }
+
+
+def collect_metrics(manager: UploadManager):
+    stats = manager.stats()
+    return [
+        ("braindump_remote_files", "gauge", "Uploaded files currently tracked for reuse", [({}, stats["files"])]),
+        ("braindump_remote_file_uploads_total", "counter", "Files uploaded to the model provider",
+         [({}, stats["uploads"])]),
+        ("braindump_remote_file_reuses_total", "counter", "Uploads avoided by reusing a remote file",
+         [({}, stats["reused"])]),
+        ("braindump_remote_file_deletes_total", "counter", "Remote file deletions by outcome", [
+            ({"result": "ok"}, stats["deleted"]),
+            ({"result": "failed"}, stats["delete_failures"]),
+        ]),
+    ]
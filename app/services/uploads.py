@@ -0,0 +1,220 @@
+import hashlib
+import io
+import mimetypes
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from app.core.metrics import timed
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+# OpenAPI description for endpoints that read the multipart body themselves
+MULTIPART_FILE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+_private_dir = None
+
+
+def _upload_dir() -> str:
+    # One 0700 directory per process, nothing ends up in the working directory
+    global _private_dir
+    if _private_dir is None or not os.path.isdir(_private_dir):
+        _private_dir = tempfile.mkdtemp(prefix="braindump-uploads-", dir=settings.UPLOAD_TEMP_DIR or None)
+    return _private_dir
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class SpooledUpload:
+    """
+    Upload sink that hashes and size-checks bytes as they arrive.
+    Payloads up to UPLOAD_MEMORY_LIMIT stay in memory, larger ones roll over
+    to a file in the private upload directory. Always close() it.
+    """
+
+    def __init__(self, filename: Optional[str] = None, content_type: Optional[str] = None,
+                 max_bytes: int = None, memory_limit: int = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+        self.memory_limit = settings.UPLOAD_MEMORY_LIMIT if memory_limit is None else memory_limit
+        self.size = 0
+        self.path: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._data = b""
+        self._file = None
+
+    @property
+    def content_hash(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def mime_type(self) -> Optional[str]:
+        if self.content_type and self.content_type != "application/octet-stream":
+            return self.content_type
+        return mimetypes.guess_type(self.filename or "")[0] or self.content_type
+
+    def write(self, data) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._hash.update(data)
+        if self._file is None and self.size > self.memory_limit:
+            self._rollover()
+        (self._file or self._buffer).write(data)
+
+    def _rollover(self):
+        suffix = os.path.splitext(self.filename or "")[1][:10]
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=_upload_dir())
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+        else:
+            self._data = self._buffer.getvalue()
+            self._buffer = None
+
+    @property
+    def source(self):
+        """
+        What the model backend uploads: the spool file path, or a reader over
+        the in-memory bytes (BytesIO shares the bytes object, no copy).
+        """
+        return self.path if self.path else io.BytesIO(self._data)
+
+    def save_to(self, path: str):
+        """Moves the payload to `path` (a rename when it already lives on disk)."""
+        if self.path:
+            shutil.move(self.path, path)
+            self.path = None
+        else:
+            with open(path, "wb") as f:
+                f.write(self._data)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+        self._buffer = None
+        self._data = b""
+
+
+async def receive_upload(request: Request, field: str = "file") -> SpooledUpload:
+    """
+    Streams the request body into a SpooledUpload without letting Starlette
+    spool the whole form first. Accepts multipart/form-data (the `file` field)
+    or a raw body with the payload's own Content-Type.
+    Raises 413 when the payload is over UPLOAD_MAX_BYTES.
+    """
+    with timed("receive_upload"):
+        return await _receive_upload(request, field)
+
+
+async def _receive_upload(request: Request, field: str) -> SpooledUpload:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if isinstance(content_type, bytes):
+        content_type = content_type.decode("latin-1")
+
+    if content_type != "multipart/form-data":
+        upload = SpooledUpload(filename=request.query_params.get("filename"), content_type=content_type or None)
+        try:
+            async for chunk in request.stream():
+                upload.write(chunk)
+            upload.finish()
+        except UploadTooLarge as e:
+            upload.close()
+            raise HTTPException(status_code=413, detail=str(e))
+        except BaseException:
+            upload.close()
+            raise
+        return upload
+
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+
+    state = {"headers": {}, "field": b"", "value": b"", "sink": None, "upload": None}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name", b"").decode("utf-8", "replace") == field and state["upload"] is None:
+            filename = disposition.get(b"filename")
+            part_type = state["headers"].get(b"content-type")
+            state["upload"] = SpooledUpload(
+                filename=os.path.basename(filename.decode("utf-8", "replace")) if filename else None,
+                content_type=part_type.decode("latin-1") if part_type else None,
+            )
+            state["sink"] = state["upload"]
+
+    def on_part_data(data, start, end):
+        if state["sink"] is not None:
+            state["sink"].write(data[start:end])
+
+    def on_part_end():
+        state["headers"], state["sink"] = {}, None
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except UploadTooLarge as e:
+        if state["upload"] is not None:
+            state["upload"].close()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        if state["upload"] is not None:
+            state["upload"].close()
+        raise
+
+    upload = state["upload"]
+    if upload is None:
+        raise HTTPException(status_code=422, detail=f"Missing '{field}' file field")
+    upload.finish()
+    return upload
@@ -0,0 +1,272 @@
+"""
+Mixed-workload load test against the app running in-process on the stub model.
+
+No server, no Gemini key: the app is driven through httpx's ASGI transport
+with MODEL_BACKEND=stub and a throwaway SQLite database. The stub's latency,
+error rate and 429 rate are configurable, so the retry/fallback paths are
+part of the measurement.
+
+    python bench_load.py --duration 20 --concurrency 32 --latency-ms 300 --error-rate 0.02
+
+Every run is appended to bench_results.jsonl with the current commit, and the
+report compares against the last run with the same parameters.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = "text=4,image=1,ask=2,actions=4"
+
+SENTENCES = [
+    "Yarın saat 3'te Mehmet ile kahve içeceğim", "Eve gelirken kedi maması almalıyım",
+    "Cuma günü faturayı öde", "Annemi ara", "Spor salonuna yazıl", "Proje sunumunu hazırla",
+    "Süt ve ekmek al", "Perşembe dişçi randevusu var", "Kitap okumaya başla", "Arabanın bakımı gelmiş",
+]
+QUESTIONS = ["Yarın ne yapacağım?", "Alışveriş listemde ne var?", "Bu hafta hangi randevularım var?",
+             "Kimi aramam gerekiyor?"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of measured load")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent virtual clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--latency-ms", type=int, default=200, help="stub model latency")
+    parser.add_argument("--jitter-ms", type=int, default=50, help="stub latency +/- jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of model calls failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of model calls failing with 429")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1,
+                        help="share of text/image requests repeating an earlier input (cache/coalescing)")
+    parser.add_argument("--seed-actions", type=int, default=500, help="actions inserted before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.jsonl")
+    return parser.parse_args()
+
+
+def configure_env(args, workdir):
+    # Must happen before the app (and its Settings) is imported
+    os.environ.update({
+        "MODEL_BACKEND": "stub",
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_LATENCY_JITTER_MS": str(args.jitter_ms),
+        "STUB_ERROR_RATE": str(args.error_rate),
+        "STUB_RATE_LIMIT_RATE": str(args.rate_limit_rate),
+        "STUB_SEED": str(args.seed),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "JOB_STORAGE_DIR": os.path.join(workdir, "job_files"),
+        # Measure the service, not the client-side quota meant for the real API
+        "MODEL_FLASH_RPM": "0",
+        "MODEL_PRO_RPM": "0",
+        "RETRY_BACKOFF_BASE_SECONDS": "0.05",
+        "RETRY_BACKOFF_MAX_SECONDS": "0.5",
+        "WARM_UP_ON_STARTUP": "false",
+    })
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"text", "image", "ask", "actions"}
+    if unknown:
+        raise SystemExit(f"Unknown workload(s) in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    # nearest-rank
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def git_commit() -> dict:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": sha, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class Workload:
+    def __init__(self, client, rng: random.Random, duplicate_rate: float):
+        self.client = client
+        self.rng = rng
+        self.duplicate_rate = duplicate_rate
+        self.counter = 0
+        self.seen_texts = []
+        self.seen_images = []
+
+    def _fresh(self, seen: list, make):
+        if seen and self.rng.random() < self.duplicate_rate:
+            return self.rng.choice(seen)
+        self.counter += 1
+        value = make(self.counter)
+        seen.append(value)
+        return value
+
+    async def text(self):
+        text = self._fresh(self.seen_texts, lambda n: ". ".join(self.rng.sample(SENTENCES, 3)) + f". Not {n}")
+        return await self.client.post("/api/v1/audio/process-text", json={"text": text})
+
+    async def image(self):
+        body = self._fresh(self.seen_images, lambda n: self.rng.randbytes(32 * 1024) + n.to_bytes(4, "big"))
+        return await self.client.post("/api/v1/process-image", files={"file": ("photo.jpg", body, "image/jpeg")})
+
+    async def ask(self):
+        return await self.client.post("/api/v1/ask", json={"question": self.rng.choice(QUESTIONS)})
+
+    async def actions(self):
+        params = {"limit": 50}
+        if self.rng.random() < 0.3:
+            params["type"] = self.rng.choice(["TODO", "NOTE", "SHOPPING_ITEM", "CALENDAR_EVENT"])
+        return await self.client.get("/api/v1/actions/", params=params)
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.main import app
+
+    weights = parse_mix(args.mix)
+    names, cumulative = list(weights), []
+    total = 0.0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            rng = random.Random(args.seed)
+            workload = Workload(client, rng, args.duplicate_rate)
+
+            # Seed data so /ask and /actions have something to read
+            for start in range(0, args.seed_actions, 10):
+                text = ". ".join(f"{rng.choice(SENTENCES)} {start + i}" for i in range(10))
+                await client.post("/api/v1/audio/process-text", json={"text": text})
+
+            deadline = time.perf_counter() + args.duration
+
+            async def virtual_client():
+                while time.perf_counter() < deadline:
+                    roll = rng.random() * total
+                    name = names[next(i for i, c in enumerate(cumulative) if roll < c)]
+                    started = time.perf_counter()
+                    try:
+                        response = await getattr(workload, name)()
+                        ok = response.status_code < 400
+                    except Exception:
+                        ok = False
+                    latencies[name].append(time.perf_counter() - started)
+                    if not ok:
+                        errors[name] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[virtual_client() for _ in range(args.concurrency)])
+            elapsed = time.perf_counter() - started
+
+            cache_stats = (await client.get("/api/v1/cache/stats")).json()
+
+    from app.services.ai_service import ai_service
+
+    def summarize(samples, failed):
+        return {
+            "requests": len(samples),
+            "errors": failed,
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+        }
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total": summarize(all_samples, sum(errors.values())),
+        "endpoints": {name: summarize(latencies[name], errors[name]) for name in names if latencies[name]},
+        "model_policy": ai_service.policy.stats(),
+        "result_cache": cache_stats,
+    }
+
+
+def previous_run(path: str, params: dict):
+    if not os.path.exists(path):
+        return None
+    last = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("params") == params:
+                last = entry
+    return last
+
+
+def delta(new: float, old: float) -> str:
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def report(result: dict, previous: dict):
+    print(f"\n{'endpoint':>10} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + ("   vs " + str(previous["commit"]) if previous else ""))
+    rows = list(result["endpoints"].items()) + [("total", result["total"])]
+    for name, row in rows:
+        line = (f"{name:>10} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+        old = (previous["result"]["endpoints"].get(name) if name != "total" else previous["result"]["total"]) \
+            if previous else None
+        if old:
+            line += f"   rps {delta(row['rps'], old['rps']):>5}  p95 {delta(row['p95_ms'], old['p95_ms']):>5}"
+        print(line)
+    stats = result["model_policy"]
+    print(f"\nretries={stats['retries']} fallbacks={stats['fallbacks']} short_circuited={stats['short_circuited']} "
+          f"breaker={stats['breaker_state']} cache_hit_ratio={result['result_cache'].get('hit_ratio')}")
+
+
+def main():
+    args = parse_args()
+    params = {k: v for k, v in vars(args).items() if k != "out"}
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(args, workdir)
+        sys.path.insert(0, ROOT)
+        result = asyncio.run(run(args))
+
+    previous = previous_run(args.out, params)
+    report(result, previous)
+
+    entry = {
+        **git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "params": params,
+        "result": result,
+    }
+    with open(args.out, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"\nSaved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Offset vs keyset paging on GET /actions/ at 1M rows.
+
+Builds a throwaway SQLite file with the real schema and indexes, then times
+action_crud.get_actions (OFFSET) against action_crud.get_actions_page (cursor)
+at increasing depths.
+
+    python bench_pagination.py [rows]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import action_crud
+from app.models import sql_models
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PAGE = 50
+REPEAT = 5
+TYPES = ["CALENDAR_EVENT", "SHOPPING_ITEM", "TODO", "NOTE", "ALARM", "REMINDER"]
+
+
+def build(path):
+    engine = create_engine(f"sqlite:///{path}")
+    sql_models.Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    # Core insert with datetime objects: the DateTime type stores them exactly like the app
+    # does ("2024-01-01 00:00:07.000000"), so the keyset comparisons run on the same text
+    with engine.begin() as conn:
+        batch = []
+        for i in range(ROWS):
+            created = start + timedelta(seconds=i * 7)
+            batch.append({
+                "type": rng.choice(TYPES), "content": f"action {i}",
+                "category": rng.choice(["Work", "Health", "Personal", None]),
+                "datetime_iso": created + timedelta(days=rng.randint(0, 30)),
+                "priority": rng.choice(["HIGH", "MEDIUM", "LOW", None]), "confidence": 0.9, "created_at": created,
+            })
+            if len(batch) == 50_000:
+                conn.execute(insert(sql_models.Action), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(sql_models.Action), batch)
+        conn.exec_driver_sql("ANALYZE")
+    return engine
+
+
+def timed(func):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    try:
+        run(os.path.join(workdir, "bench_actions.db"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(path):
+    print(f"Building {ROWS:,} rows in {path} ...")
+    t0 = time.perf_counter()
+    engine = build(path)
+    print(f"Built in {time.perf_counter() - t0:.1f}s\n")
+
+    db = sessionmaker(bind=engine)()
+    print(f"{'depth':>10} {'filter':>8} {'offset ms':>10} {'keyset ms':>10} {'speedup':>8}")
+    for filters in ({}, {"type": "TODO"}):
+        for depth in (0, 10_000, 100_000, 500_000, ROWS - 2 * PAGE * 10):
+            if depth < 0:
+                continue
+            # cursor of the row just before `depth`, fetched outside the timing
+            anchor = action_crud.get_actions(db, skip=max(depth - 1, 0), limit=1, **filters)
+            if not anchor:
+                continue
+            cursor = action_crud.encode_cursor(anchor[0]) if depth else None
+
+            offset_ms = timed(lambda: action_crud.get_actions(db, skip=depth, limit=PAGE, **filters))
+            keyset_ms = timed(lambda: action_crud.get_actions_page(db, limit=PAGE, cursor=cursor, **filters))
+            db.expunge_all()
+            label = filters.get("type", "-")
+            print(f"{depth:>10,} {label:>8} {offset_ms:>10.2f} {keyset_ms:>10.2f} {offset_ms / keyset_ms:>7.1f}x")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
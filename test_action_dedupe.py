@@ -0,0 +1,110 @@
+"""
+Near-duplicate merging on insert: the MinHash index on its own (similarity,
+type, time tolerance), then concurrent dumps through the real store path.
+
+The store test runs in a fresh interpreter inside an empty temp directory,
+so it gets its own braindump.db:
+
+    python test_action_dedupe.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from app.services.action_dedupe import NearDuplicateIndex, fingerprint, jaccard, shingles
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+AT = datetime(2026, 3, 2, 15, 0)
+
+
+def index() -> NearDuplicateIndex:
+    return NearDuplicateIndex(window_hours=24, min_similarity=0.8, tolerance_minutes=15, max_entries=100)
+
+
+def test_normalized_text_is_similar():
+    assert shingles("Süt AL!") == shingles("sut al")
+    assert shingles("FATURAYI ÖDE") == shingles("faturayi ode")
+    assert jaccard(shingles("süt al"), shingles("ekmek al")) < 0.5
+
+
+def test_find_merges_near_duplicates_only():
+    idx = index()
+    idx.add(1, fingerprint("SHOPPING_ITEM", "Süt al"))
+    idx.add(2, fingerprint("TODO", "Faturayı öde"))
+    assert idx.find(fingerprint("SHOPPING_ITEM", "süt al.")) == 1
+    assert idx.find(fingerprint("SHOPPING_ITEM", "ekmek al")) is None
+    # Same words, different type
+    assert idx.find(fingerprint("TODO", "süt al")) is None
+    assert idx.find(fingerprint("TODO", "faturayi ode")) == 2
+
+
+def test_time_tolerance():
+    idx = index()
+    idx.add(1, fingerprint("CALENDAR_EVENT", "Ahmet ile toplantı", AT))
+    assert idx.find(fingerprint("CALENDAR_EVENT", "Ahmet ile toplantı", AT + timedelta(minutes=10))) == 1
+    assert idx.find(fingerprint("CALENDAR_EVENT", "Ahmet ile toplantı", AT + timedelta(days=1))) is None
+    # Dated vs undated are different actions too
+    assert idx.find(fingerprint("CALENDAR_EVENT", "Ahmet ile toplantı")) is None
+
+
+def test_window_and_remove():
+    idx = index()
+    now = datetime.utcnow()
+    idx.add(1, fingerprint("NOTE", "kedi maması"), now - timedelta(hours=25))
+    idx.add(2, fingerprint("NOTE", "kedi kumu"), now)
+    assert idx.find(fingerprint("NOTE", "kedi maması"), now) is None  # expired
+    idx.remove(2)
+    assert idx.find(fingerprint("NOTE", "kedi kumu"), now) is None and len(idx) == 0
+
+
+CONCURRENT_SNIPPET = """
+import asyncio, json
+from app.main import init_db
+from app.core.database import SessionLocal
+from app.crud import action_crud
+from app.models.schemas import BrainDumpResponse, ProcessedAction
+from app.models.sql_models import Action
+from app.services.pipeline import process_and_store
+
+TEXTS = ["Süt al", "Süt al!", "süt al", "SÜT AL.", "Sut al"]
+
+async def dump(i, text):
+    async def process():
+        return BrainDumpResponse(summary="", actions=[
+            ProcessedAction(type="SHOPPING_ITEM", content=text, confidence=1.0)])
+    return await process_and_store("text", f"retry-{i}", process)
+
+init_db()
+db = SessionLocal()
+action_crud.load_dedupe_index(db)
+
+async def main():
+    await asyncio.gather(*[dump(i, text) for i, text in enumerate(TEXTS)])
+
+asyncio.run(main())
+print(json.dumps({"rows": db.query(Action).count()}))
+"""
+
+
+def test_concurrent_dumps_merge():
+    # Different content hashes, so single-flight doesn't coalesce them: only the index can
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run(
+            [sys.executable, "-c", CONCURRENT_SNIPPET], cwd=cwd, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1", "MODEL_BACKEND": "stub",
+                 "WARM_UP_ON_STARTUP": "false", "ACTION_DEDUPE_ENABLED": "true"},
+        )
+    rows = json.loads(out.stdout.strip().splitlines()[-1])["rows"]
+    assert rows == 1, f"5 concurrent near-duplicate dumps stored {rows} rows"
+
+
+if __name__ == "__main__":
+    test_normalized_text_is_similar()
+    test_find_merges_near_duplicates_only()
+    test_time_tolerance()
+    test_window_and_remove()
+    test_concurrent_dumps_merge()
+    print("OK")
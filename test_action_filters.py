@@ -0,0 +1,81 @@
+"""
+datetime_from / datetime_to filters on GET /actions and /actions/export with
+UTC offsets: the column is naive UTC, so "14:30+03:00" has to match like "11:30Z".
+
+Runs the app in a fresh interpreter inside an empty temp directory, so it
+gets its own braindump.db:
+
+    python test_action_filters.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SNIPPET = """
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.database import SessionLocal
+from app.crud import action_crud
+from app.models.schemas import ActionImport
+
+CASES = {
+    "utc": "2030-01-01T11:30:00Z",
+    "offset": "2030-01-01T14:30:00+03:00",
+    "after_offset": "2030-01-01T15:30:00+03:00",
+}
+
+with TestClient(app) as client:
+    db = SessionLocal()
+    action_crud.import_actions(db, [ActionImport(type="CALENDAR_EVENT", content="toplanti",
+                                                 datetime_iso="2030-01-01T12:00:00Z")])
+    db.close()
+    results = {}
+    for name, since in CASES.items():
+        listed = client.get("/api/v1/actions/", params={"datetime_from": since}).json()
+        results[name] = len(listed)
+        for format in ("ndjson", "csv"):
+            exported = client.get("/api/v1/actions/export", params={"datetime_from": since, "format": format})
+            lines = exported.text.splitlines()
+            results[f"export_{format}_{name}"] = len(lines) - (format == "csv")  # minus the header
+    until = client.get("/api/v1/actions/", params={"datetime_to": "2030-01-01T15:30:00+03:00"}).json()
+    results["until_offset"] = len(until)
+print(json.dumps(results))
+"""
+
+
+def run(snippet):
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run(
+            [sys.executable, "-c", snippet], cwd=cwd, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1", "MODEL_BACKEND": "stub",
+                 "WARM_UP_ON_STARTUP": "false"},
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_list_filters_with_offsets():
+    results = run(SNIPPET)
+    # The action is at 12:00Z
+    assert results["utc"] == 1, results
+    assert results["offset"] == 1, results  # 11:30Z
+    assert results["after_offset"] == 0, results  # 12:30Z
+    assert results["until_offset"] == 1, results  # before 12:30Z
+
+
+def test_export_filters_with_offsets():
+    results = run(SNIPPET)
+    for format in ("ndjson", "csv"):
+        assert results[f"export_{format}_utc"] == 1, results
+        assert results[f"export_{format}_offset"] == 1, results
+        assert results[f"export_{format}_after_offset"] == 0, results
+
+
+if __name__ == "__main__":
+    test_list_filters_with_offsets()
+    test_export_filters_with_offsets()
+    print("OK")
@@ -0,0 +1,59 @@
+"""
+BackgroundLoop keeps the ids a failing step took: they are handed back and
+picked up again by the retry after error_delay(). No backend or database.
+
+    python test_background_loop.py
+"""
+import asyncio
+
+from app.services.background_loop import BackgroundLoop
+
+
+class FlakyLoop(BackgroundLoop):
+    name = "Flaky loop"
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.loaded = []
+        self.done = asyncio.Event()
+
+    def error_delay(self) -> float:
+        return 0.01
+
+    async def _step(self, now) -> float:
+        ids = self._take_ids()
+        if ids:
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("database is locked")
+            self.loaded.extend(ids)
+            if len(self.loaded) >= 3:
+                self.done.set()
+        return 60.0
+
+
+async def _notify_through_failures(failures):
+    loop = FlakyLoop(failures)
+    loop.start()
+    await asyncio.sleep(0)
+    loop._notify([1, 2])
+    await asyncio.sleep(0)
+    loop._notify([3])
+    await asyncio.wait_for(loop.done.wait(), 1)
+    await loop.stop()
+    return loop.loaded
+
+
+def test_failed_step_keeps_ids():
+    assert sorted(asyncio.run(_notify_through_failures(2))) == [1, 2, 3]
+
+
+def test_ids_loaded_once_without_failures():
+    assert sorted(asyncio.run(_notify_through_failures(0))) == [1, 2, 3]
+
+
+if __name__ == "__main__":
+    test_failed_step_keeps_ids()
+    test_ids_loaded_once_without_failures()
+    print("OK")
@@ -0,0 +1,74 @@
+"""
+Cold start budget: importing app.main and running the startup lifespan.
+
+Runs each measurement in a fresh interpreter inside an empty temp directory,
+so nothing is cached and no braindump.db exists yet. Budgets can be tuned
+for slower machines:
+
+    IMPORT_BUDGET_MS=1500 STARTUP_BUDGET_MS=2500 python test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2500"))
+RUNS = int(os.getenv("IMPORT_RUNS", "3"))
+
+IMPORT_SNIPPET = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import app.main
+print(json.dumps({
+    "ms": (time.perf_counter() - t0) * 1000,
+    "genai_imported": "google.generativeai" in sys.modules,
+    "db_created": os.path.exists("braindump.db"),
+}))
+"""
+
+STARTUP_SNIPPET = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from app.main import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        return (time.perf_counter() - t0) * 1000
+
+print(json.dumps({"ms": asyncio.run(main())}))
+"""
+
+
+def run(snippet, **env):
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run(
+            [sys.executable, "-c", snippet], cwd=cwd, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1", **env},
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_time():
+    results = [run(IMPORT_SNIPPET) for _ in range(RUNS)]
+    best = min(r["ms"] for r in results)
+    print(f"import app.main: best {best:.0f}ms of {RUNS} (budget {IMPORT_BUDGET_MS:.0f}ms)")
+    assert not results[0]["genai_imported"], "google.generativeai is imported eagerly"
+    assert not results[0]["db_created"], "importing the app touched the database"
+    assert best <= IMPORT_BUDGET_MS, f"import took {best:.0f}ms, budget is {IMPORT_BUDGET_MS:.0f}ms"
+
+
+def test_startup_time():
+    # Stub backend and no warm-up: measures import + schema setup + job workers only
+    env = {"MODEL_BACKEND": "stub", "WARM_UP_ON_STARTUP": "false"}
+    best = min(run(STARTUP_SNIPPET, **env)["ms"] for _ in range(RUNS))
+    print(f"startup until ready: best {best:.0f}ms of {RUNS} (budget {STARTUP_BUDGET_MS:.0f}ms)")
+    assert best <= STARTUP_BUDGET_MS, f"startup took {best:.0f}ms, budget is {STARTUP_BUDGET_MS:.0f}ms"
+
+
+if __name__ == "__main__":
+    test_import_time()
+    test_startup_time()
+    print("OK")
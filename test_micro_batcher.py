@@ -0,0 +1,51 @@
+"""
+MicroBatcher cancellation: when a batch task is cancelled mid-run (shutdown),
+every caller waiting on that batch must be released instead of hanging.
+No backend or database.
+
+    python test_micro_batcher.py
+"""
+import asyncio
+
+from app.services.micro_batcher import MicroBatcher
+
+
+async def _cancel_running_batch():
+    started = asyncio.Event()
+
+    async def run_batch(items):
+        started.set()
+        await asyncio.sleep(10)  # the model call
+        return items
+
+    batcher = MicroBatcher(run_batch, max_size=3, max_wait_ms=1000)
+    callers = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+    await asyncio.wait_for(started.wait(), 1)
+    for task in list(batcher._running):
+        task.cancel()
+    return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+
+
+async def _results_delivered():
+    async def run_batch(items):
+        return [item * 2 if item else ValueError("zero") for item in items]
+
+    batcher = MicroBatcher(run_batch, max_size=3, max_wait_ms=1000)
+    return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+
+def test_cancelled_batch_releases_callers():
+    results = asyncio.run(_cancel_running_batch())
+    assert all(isinstance(r, asyncio.CancelledError) for r in results), results
+
+
+def test_results_and_errors_delivered():
+    results = asyncio.run(_results_delivered())
+    assert isinstance(results[0], ValueError), results
+    assert results[1:] == [2, 4], results
+
+
+if __name__ == "__main__":
+    test_cancelled_batch_releases_callers()
+    test_results_and_errors_delivered()
+    print("OK")
@@ -0,0 +1,137 @@
+"""
+Circuit breaker and deadline bookkeeping in ModelPolicy/AIService, against a fake backend:
+no network, no database.
+
+    python test_model_policy.py
+"""
+import asyncio
+import time
+
+from app.models.schemas import BrainDumpResponse
+from app.services.ai_service import AIService
+from app.services.model_backend import ModelBackend, ModelResponse
+from app.services.model_policy import ModelPolicy
+
+
+class FakeBackend(ModelBackend):
+    """Answers after `delay` seconds; stream() yields `chunks` with `delay` before each."""
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0, chunks=("a", "b", "c")):
+        self.delay = delay
+        self.chunks = chunks
+        self.calls = []
+
+    async def generate(self, model, contents, json_mode=False):
+        self.calls.append(model)
+        await asyncio.sleep(self.delay)
+        return ModelResponse(text='{"summary": "ok", "actions": []}', model=model)
+
+    async def stream(self, model, contents, json_mode=False, result=None):
+        self.calls.append(model)
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+def half_open_policy() -> ModelPolicy:
+    policy = ModelPolicy()
+    policy.buckets = {}  # no client-side quota in tests
+    policy.breaker.opened_at = time.monotonic() - policy.breaker.reset_seconds - 1
+    assert policy.breaker.state == "half_open"
+    return policy
+
+
+async def _cancelled_probe():
+    policy = half_open_policy()
+    slow = FakeBackend(delay=10)
+    probe = asyncio.create_task(policy.generate(slow, "text", ["x"]))
+    await asyncio.sleep(0.05)
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+
+    fast = FakeBackend()
+    response = await policy.generate(fast, "text", ["x"])
+    return policy, response
+
+
+def test_cancelled_probe_is_released():
+    policy, response = asyncio.run(_cancelled_probe())
+    assert response.model == "flash", f"next call went to {response.model}, the probe was never released"
+    assert policy.breaker.state == "closed"
+
+
+async def _abandoned_stream():
+    policy = half_open_policy()
+    service = AIService(backend=FakeBackend(delay=0.01), policy=policy)
+    stream = service.stream_answer([], "q")
+    assert await stream.__anext__() == "a"
+    await stream.aclose()  # client disconnected after the first chunk
+    return policy
+
+
+def test_abandoned_stream_releases_probe():
+    policy = asyncio.run(_abandoned_stream())
+    assert not policy.breaker._probing
+    assert policy.pick_model() == "flash"
+
+
+class StallingBackend(FakeBackend):
+    """Streams one chunk, then hangs; generate() still answers."""
+
+    async def stream(self, model, contents, json_mode=False, result=None):
+        self.calls.append(model)
+        yield '{"summary": "s", "actions": ['
+        await asyncio.sleep(10)
+        yield "]}"
+
+
+def deadline_policy() -> ModelPolicy:
+    policy = ModelPolicy()
+    policy.buckets = {}
+    policy.timeouts = {"flash": 0.2, "pro": 0.2}
+    return policy
+
+
+async def _stalled_answer():
+    policy = deadline_policy()
+    service = AIService(backend=StallingBackend(), policy=policy)
+    chunks = []
+    started = time.perf_counter()
+    try:
+        async for chunk in service.stream_answer([], "q"):
+            chunks.append(chunk)
+    except asyncio.TimeoutError:
+        return policy, chunks, time.perf_counter() - started
+    raise AssertionError("stalled stream didn't time out")
+
+
+def test_stalled_stream_times_out():
+    policy, chunks, elapsed = asyncio.run(_stalled_answer())
+    assert len(chunks) == 1
+    assert elapsed < 1, f"took {elapsed:.1f}s"
+    assert policy.timeouts_hit["flash"] == 1
+
+
+async def _stalled_actions():
+    policy = deadline_policy()
+    backend = StallingBackend()
+    service = AIService(backend=backend, policy=policy)
+    result = BrainDumpResponse(summary="", actions=[])
+    # No action sent yet when it stalls: falls back to the regular (non-streaming) call
+    actions = [a async for a in service._stream_actions("text", ["x"], result)]
+    return policy, backend, actions
+
+
+def test_stalled_action_stream_falls_back():
+    policy, backend, actions = asyncio.run(_stalled_actions())
+    assert policy.timeouts_hit["flash"] == 1
+    assert len(backend.calls) >= 2, backend.calls
+
+
+if __name__ == "__main__":
+    test_cancelled_probe_is_released()
+    test_abandoned_stream_releases_probe()
+    test_stalled_stream_times_out()
+    test_stalled_action_stream_falls_back()
+    print("OK")
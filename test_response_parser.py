@@ -0,0 +1,97 @@
+"""
+Model output parsing: repair_json / parse_brain_dump on whole documents and
+IncrementalDumpParser on streamed ones. Pure functions, no backend or database.
+
+    python test_response_parser.py
+"""
+import json
+
+from app.services.response_parser import IncrementalDumpParser, parse_brain_dump, repair_json, strip_fences
+
+ACTION = {"type": "TODO", "content": "Süt al", "confidence": 0.9}
+DUMP = {"summary": "Bir iş", "actions": [ACTION, {"type": "NOTE", "content": "a } b ] c \" d", "confidence": 1}]}
+
+
+def test_fences_and_surrounding_text():
+    fenced = "```json\n" + json.dumps(DUMP) + "\n```"
+    assert json.loads(repair_json(strip_fences(fenced))) == DUMP
+    chatty = "Sure! Here it is: " + json.dumps(DUMP) + " Let me know if you need anything else {"
+    assert json.loads(repair_json(chatty)) == DUMP
+
+
+def test_trailing_commas():
+    text = '{"summary": "s", "actions": [{"type": "TODO", "content": "x", "confidence": 1,}, ],}'
+    assert json.loads(repair_json(text)) == {
+        "summary": "s", "actions": [{"type": "TODO", "content": "x", "confidence": 1}]}
+
+
+def test_truncation_keeps_complete_elements():
+    full = json.dumps(DUMP)
+    cut = full[:full.index('"NOTE"')]  # second action cut off mid-object
+    assert json.loads(repair_json(cut)) == {"summary": "Bir iş", "actions": [ACTION]}
+    try:
+        repair_json('{"summary": "cut before anyth')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("nothing complete to keep, should raise")
+
+
+def test_closers_inside_strings():
+    assert json.loads(repair_json(json.dumps(DUMP))) == DUMP
+
+
+def test_parse_brain_dump_drops_invalid_actions():
+    text = '{"summary": "s", "actions": [{"type": "TODO", "content": "x", "confidence": 1}, {"type": "BOGUS"},]}'
+    result = parse_brain_dump(text)
+    assert [a.content for a in result.actions] == ["x"]
+    assert result.summary == "s"
+
+
+def feed_all(chunks):
+    parser = IncrementalDumpParser()
+    actions = []
+    for chunk in chunks:
+        actions.extend(parser.feed(chunk))
+    return parser, actions
+
+
+def test_incremental_any_chunking():
+    text = json.dumps(DUMP, ensure_ascii=False)
+    for size in (1, 2, 3, 7, len(text)):
+        parser, actions = feed_all(text[i:i + size] for i in range(0, len(text), size))
+        assert actions == DUMP["actions"], size
+        assert parser.summary == DUMP["summary"], size
+        assert parser.found_actions
+
+
+def test_incremental_emits_before_the_end():
+    text = json.dumps(DUMP)
+    parser = IncrementalDumpParser()
+    first_end = text.index("}") + 1
+    assert parser.feed(text[:first_end]) == [ACTION]
+    assert parser.feed(text[first_end:]) == DUMP["actions"][1:]
+
+
+def test_incremental_key_order():
+    # Summary after the actions, and a nested "actions" key that is not the top-level array
+    doc = {"actions": [{"type": "NOTE", "content": "x", "confidence": 1, "meta": {"actions": [{"no": 1}]}}],
+           "summary": "late"}
+    parser, actions = feed_all([json.dumps(doc)])
+    assert actions == doc["actions"]
+    assert parser.summary == "late"
+
+    parser, actions = feed_all(['{"summary": "s", "other": [{"type": "TODO"}]}'])
+    assert actions == [] and not parser.found_actions
+
+
+if __name__ == "__main__":
+    test_fences_and_surrounding_text()
+    test_trailing_commas()
+    test_truncation_keeps_complete_elements()
+    test_closers_inside_strings()
+    test_parse_brain_dump_drops_invalid_actions()
+    test_incremental_any_chunking()
+    test_incremental_emits_before_the_end()
+    test_incremental_key_order()
+    print("OK")
@@ -0,0 +1,61 @@
+"""
+Single-flight ownership of uploads: the request that started a shared call may
+go away, the call (and everyone waiting on it) must still be able to read the
+upload. No backend or database.
+
+    python test_single_flight.py
+"""
+import asyncio
+import os
+
+from app.services.single_flight import SingleFlight
+from app.services.uploads import SpooledUpload
+
+PAYLOAD = b"x" * 4096
+
+
+def spooled_upload() -> SpooledUpload:
+    # memory_limit=0: rolled over to a temp file, like anything over UPLOAD_MEMORY_LIMIT
+    upload = SpooledUpload(filename="a.m4a", memory_limit=0)
+    upload.write(PAYLOAD)
+    upload.finish()
+    assert upload.path and os.path.exists(upload.path)
+    return upload
+
+
+async def _cancel_first_caller():
+    flight = SingleFlight()
+    first, second = spooled_upload(), spooled_upload()
+    first_path, second_path = first.path, second.path
+    started = asyncio.Event()
+
+    async def read(upload):
+        started.set()
+        await asyncio.sleep(0.1)  # the model call
+        with open(upload.source, "rb") as f:
+            return len(f.read())
+
+    starter = asyncio.create_task(flight.do("audio:h", lambda: read(first), cleanup=first.close))
+    await started.wait()
+    waiter = asyncio.create_task(flight.do("audio:h", lambda: read(second), cleanup=second.close))
+    await asyncio.sleep(0)
+    # The joiner's own copy isn't needed, the starter's is still in use
+    assert not os.path.exists(second_path)
+    assert os.path.exists(first_path)
+
+    starter.cancel()  # client that started the flight disconnects
+    result = await waiter
+    await asyncio.gather(starter, return_exceptions=True)
+    await asyncio.sleep(0)
+    return result, first_path
+
+
+def test_cancelled_starter_keeps_upload_alive():
+    result, first_path = asyncio.run(_cancel_first_caller())
+    assert result == len(PAYLOAD)
+    assert not os.path.exists(first_path), "upload not closed after the flight finished"
+
+
+if __name__ == "__main__":
+    test_cancelled_starter_keeps_upload_alive()
+    print("OK")